@@ -0,0 +1,90 @@
+"""
+Git 后端周期耗时基准
+
+对比两种 Git 后端（git_util）：
+- subprocess：每个操作启动 git 子进程（默认）
+- dulwich：提交、状态、拉取、推送在进程内完成（需要 pip install dulwich）
+
+使用方法:
+    python bench_git_backend.py               # 默认 20 个周期，每周期改动 5 个文件
+    python bench_git_backend.py 50 20         # 自定义周期数与每周期改动文件数
+
+说明:
+- 在临时目录中创建本地裸仓库作为远端，每个后端使用独立的克隆
+- 一个推送周期 = 改写文件 + commit_paths + force_push；一个拉取周期 = 远端未移动时的 force_pull(probe=True)
+- 同时统计每个周期启动的 git 进程数；未安装 dulwich 时只测 subprocess
+- 从项目根目录运行（日志按 data/config.ini 的 [logging] 写入）
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加 src 到路径
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from git_util import create_git, dulwich_available
+
+BRANCH = "main"
+
+
+def timed(fn) -> float:
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+
+def run(backend: str, root: Path, cycles: int, files: int):
+    remote = root / f"{backend}-remote.git"
+    subprocess.run(["git", "init", "--quiet", "--bare", str(remote)], check=True)
+    git = create_git(remote=str(remote), repo_dir=root / f"{backend}-work", branch=BRANCH, backend=backend)
+    git.ensure_cloned()
+    saves = git.repo_dir / "saves"
+    saves.mkdir(parents=True, exist_ok=True)
+    rels = [f"saves/slot_{i:03d}.sav" for i in range(files)]
+    for rel in rels:
+        (git.repo_dir / rel).write_bytes(b"\0" * 4096)
+    git.commit_paths(rels, "initial")
+    git.force_push()
+
+    push_t = 0.0
+    pull_t = 0.0
+    push_spawns = 0
+    pull_spawns = 0
+    for c in range(cycles):
+        for i, rel in enumerate(rels):
+            (git.repo_dir / rel).write_bytes(f"cycle {c} slot {i}\n".encode() * 256)
+        before = git.spawned
+        push_t += timed(lambda: (git.commit_paths(rels, f"cycle {c}"), git.force_push()))
+        push_spawns += git.spawned - before
+        before = git.spawned
+        pull_t += timed(lambda: git.force_pull(probe=True))
+        pull_spawns += git.spawned - before
+    print(f"{backend:>10} | {push_t / cycles * 1000:9.1f} ms | {push_spawns / cycles:12.1f} | "
+          f"{pull_t / cycles * 1000:9.1f} ms | {pull_spawns / cycles:12.1f}")
+
+
+def main():
+    args = [int(x) for x in sys.argv[1:]]
+    cycles = args[0] if len(args) > 0 else 20
+    files = args[1] if len(args) > 1 else 5
+    backends = ["subprocess"] + (["dulwich"] if dulwich_available() else [])
+    cols = ["push cycle", "spawns", "probe pull", "spawns"]
+    header = f"{'backend':>10} | " + " | ".join(f"{c:>12}" for c in cols)
+    print(f"cycles={cycles} files_per_cycle={files}")
+    print(header)
+    print("-" * len(header))
+    root = Path(tempfile.mkdtemp(prefix="bench_git_backend_"))
+    try:
+        for backend in backends:
+            run(backend, root, cycles, files)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    if "dulwich" not in backends:
+        print("dulwich 未安装，跳过进程内后端")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+快照内存与比较耗时基准
+
+对比两种快照表示：
+- dict：路径字符串 -> (mtime_ns, size) 元组（旧实现）
+- CompactSnapshot：目录前缀 + 并行数组（watcher_util/snapshot.py）
+
+使用方法:
+    python bench_snapshot.py                  # 默认 10k / 100k / 1M 文件
+    python bench_snapshot.py 10000 50000      # 自定义文件数
+
+说明:
+- 不访问文件系统，按每目录 100 个文件合成快照
+- 内存使用 tracemalloc 统计构建快照时新增的分配；文件名字符串在扫描器与快照间共享，不计入 CompactSnapshot
+- 比较耗时分别测量“无变化”和“0.1% 文件变化”两种情况
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from array import array
+from pathlib import Path
+
+# 添加 src 到路径
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from watcher_util.snapshot import CompactSnapshot, diff_compact
+from watcher_util.watcher_helpers import compare_snapshots
+
+FILES_PER_DIR = 100
+ROOT = "/home/player/.local/share/SomeGameStudio/SomeGame/saves"
+
+
+def make_parts(n: int, bump_every: int = 0):
+    parts = []
+    for d in range((n + FILES_PER_DIR - 1) // FILES_PER_DIR):
+        count = min(FILES_PER_DIR, n - d * FILES_PER_DIR)
+        names = [f"autosave_{d:05d}_{i:03d}.sav" for i in range(count)]
+        mt = array("q", [1_700_000_000_000_000_000 + d * 1000 + i for i in range(count)])
+        sz = array("q", [4096 + i for i in range(count)])
+        if bump_every:
+            for i in range(count):
+                if (d * FILES_PER_DIR + i) % bump_every == 0:
+                    mt[i] += 1
+        parts.append((f"{ROOT}/slot_{d:05d}", names, mt, sz))
+    return parts
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return obj, used
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def as_dict(parts):
+    return {f"{d}/{n}": (m[i], s[i]) for d, ns, m, s in parts for i, n in enumerate(ns)}
+
+
+def run(n: int):
+    old_parts = make_parts(n)
+    new_parts = make_parts(n, bump_every=1000)
+    # 同一扫描器下两次快照共享文件名字符串
+    new_parts = [(d, op[1], m, s) for (d, _, m, s), op in zip(new_parts, old_parts)]
+
+    old_dict, dict_mem = measure(lambda: as_dict(old_parts))
+    new_dict = as_dict(new_parts)
+    old_cs, cs_mem = measure(lambda: CompactSnapshot.from_parts(old_parts))
+    same_cs = CompactSnapshot.from_parts(old_parts)
+    new_cs = CompactSnapshot.from_parts(new_parts)
+
+    same_dict = dict(old_dict)
+    t_dict_same = timed(lambda: compare_snapshots(old_dict, same_dict))
+    t_dict_diff = timed(lambda: compare_snapshots(old_dict, new_dict))
+    t_cs_same = timed(lambda: diff_compact(old_cs, same_cs))
+    t_cs_diff = timed(lambda: diff_compact(old_cs, new_cs))
+    assert compare_snapshots(old_dict, new_dict) == diff_compact(old_cs, new_cs)
+
+    print(f"{n:>9,} | {dict_mem / 2**20:9.1f} MB | {cs_mem / 2**20:9.1f} MB | "
+          f"{t_dict_same * 1000:9.1f} ms | {t_cs_same * 1000:9.1f} ms | "
+          f"{t_dict_diff * 1000:9.1f} ms | {t_cs_diff * 1000:9.1f} ms")
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    cols = ["dict mem", "compact mem", "dict same", "compact same", "dict 0.1%", "compact 0.1%"]
+    header = f"{'files':>9} | " + " | ".join(f"{c:>12}" for c in cols)
+    print(header)
+    print("-" * len(header))
+    for n in sizes:
+        run(n)
+
+
+if __name__ == "__main__":
+    main()
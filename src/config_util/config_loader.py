@@ -43,7 +43,7 @@ class ConfigLoader:
             "device_id": s.get("device_id", "").strip(),
         }
 
-    def get_git(self) -> Dict[str, str]:
+    def get_git(self) -> Dict[str, object]:
         s = self.get_section("git")
         return {
             "remote": s.get("remote", "").strip(),
@@ -51,6 +51,10 @@ class ConfigLoader:
             "repository_dir": s.get("repository_dir", "./repository").strip(),
             "token": s.get("token", "").strip(),
             "username": s.get("username", "").strip(),
+            "backend": s.get("backend", "subprocess").strip().lower(),
+            "compact_keep_commits": int(s.get("compact_keep_commits", "0")),
+            "compact_keep_days": int(s.get("compact_keep_days", "0")),
+            "maintenance_interval_hours": float(s.get("maintenance_interval_hours", "24")),
         }
 
     def get_sync(self) -> Dict[str, object]:
@@ -60,6 +64,20 @@ class ConfigLoader:
             "debounce_ms": int(s.get("debounce_ms", "1500")),
             "task_dedup_latest_only": s.get("task_dedup_latest_only", "true").lower() == "true",
             "force_overwrite": s.get("force_overwrite", "true").lower() == "true",
+            "watcher_backend": s.get("watcher_backend", "auto").strip().lower(),
+            "watch_interval_min_ms": int(s.get("watch_interval_min_ms", "0")),
+            "watch_interval_max_ms": int(s.get("watch_interval_max_ms", "30000")),
+            "watch_backoff": float(s.get("watch_backoff", "2.0")),
+            "watch_workers": int(s.get("watch_workers", "4")),
+            "settle_ms": int(s.get("settle_ms", "2000")),
+            "settle_polls": int(s.get("settle_polls", "2")),
+            "settle_max_ms": int(s.get("settle_max_ms", "60000")),
+            "content_digest": s.get("content_digest", "true").lower() == "true",
+            "mirror_mode": s.get("mirror_mode", "false").lower() == "true",
+            "copy_workers": int(s.get("copy_workers", "4")),
+            "copy_large_mb": int(s.get("copy_large_mb", "8")),
+            "push_coalesce_seconds": float(s.get("push_coalesce_seconds", "5")),
+            "push_max_latency_seconds": float(s.get("push_max_latency_seconds", "30")),
         }
 
     def get_backup(self) -> Dict[str, object]:
@@ -67,6 +85,14 @@ class ConfigLoader:
         return {
             "backup_dir": s.get("backup_dir", "./backup").strip(),
             "max_backups": int(s.get("max_backups", "20")),
+            "incremental": s.get("incremental", "true").lower() == "true",
+            "format": s.get("format", "tree").strip().lower(),
+            "compression": s.get("compression", "zlib").strip().lower(),
+            "retention": s.get("retention", "count").strip().lower(),
+            "hourly_hours": int(s.get("hourly_hours", "24")),
+            "daily_days": int(s.get("daily_days", "7")),
+            "weekly_weeks": int(s.get("weekly_weeks", "52")),
+            "max_total_mb": int(s.get("max_total_mb", "0")),
         }
 
     def get_logging(self) -> Dict[str, object]:
@@ -76,7 +76,7 @@ def get_general() -> dict:
 
 def get_git() -> dict:
     """
-    获取 Git 相关配置（remote/branch/repository_dir/token）
+    获取 Git 相关配置（remote/branch/repository_dir/token/backend/compact_keep_commits/compact_keep_days/maintenance_interval_hours）
     """
     _ensure()
     return _CONFIG.get_git()
@@ -84,7 +84,7 @@ def get_git() -> dict:
 
 def get_sync() -> dict:
     """
-    获取同步策略配置（poll_interval/debounce/dedup/force_overwrite）
+    获取同步策略配置（poll_interval/debounce/dedup/force_overwrite/watcher_backend/watch_interval/watch_workers/settle/content_digest/mirror_mode/copy/push_coalesce）
     """
     _ensure()
     return _CONFIG.get_sync()
@@ -92,7 +92,7 @@ def get_sync() -> dict:
 
 def get_backup() -> dict:
     """
-    获取备份配置（backup_dir/max_backups）
+    获取备份配置（backup_dir/max_backups/incremental/format/compression/retention/hourly_hours/daily_days/weekly_weeks/max_total_mb）
     """
     _ensure()
     return _CONFIG.get_backup()
@@ -1,6 +1,9 @@
 """
 文件工具门面
-- 暴露简洁接口：ensure_dir / copy_files / find_files
+- 暴露简洁接口：ensure_dir / copy_files / find_files / PathFilter / CopyResult / CopyEngine / staging_path
 - 采用 log_util 进行必要的日志输出
 """
 from .fs import ensure_dir, copy_files, find_files
+from .path_filter import PathFilter
+from .copy_result import CopyResult
+from .copy_engine import CopyEngine, default_engine, staging_path, STAGING_SUFFIX
@@ -0,0 +1,327 @@
+"""
+文件复制引擎
+- 小文件交给有界线程池并行复制（shutil.copy2，Linux 下内部已走 sendfile）
+- 大文件在调用线程中按 reflink（FICLONE）-> copy_file_range -> sendfile -> 普通读写 依次尝试
+- 复制后保留 mtime 等元数据（与 shutil.copy2 一致），并统计吞吐量
+- 原子模式：先写入目标同目录下的临时文件，整批 fsync 后再逐个 os.replace 到位
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from log_util import log
+from .copy_result import CopyResult
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+# 这些错误表示当前文件系统/内核不支持该路径，换下一种方式
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM}
+_CHUNK = 1 << 20
+# 原子复制时临时文件的后缀（扫描器与监控器忽略该后缀的文件）
+STAGING_SUFFIX = ".gss-staging"
+
+
+def staging_path(path: Path) -> Path:
+    """
+    目标文件对应的临时文件路径：与目标同目录（同一文件系统，os.replace 为原子操作）
+    """
+    return path.with_name(f".{path.name}{STAGING_SUFFIX}")
+
+
+class CopyEngine:
+    """
+    复制引擎
+    - workers: 小文件并行复制的线程数
+    - large_bytes: 不小于该大小的文件视为大文件，走零拷贝路径
+    - copy(pairs): 批量复制 (源, 目标)，返回 CopyResult（含耗时）
+    - 线程安全：可被备份、同步、应用等多个线程共用；shutdown() 之后仍可调用，改为在调用线程中串行复制
+    """
+    def __init__(self, workers: int = 4, large_bytes: int = 8 << 20):
+        self._workers = max(1, int(workers))
+        self._large = max(0, int(large_bytes))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # 已确认不支持 reflink 的 (源设备, 目标设备)
+        self._no_reflink: Set[Tuple[int, int]] = set()
+        self._no_copy_range = not hasattr(os, "copy_file_range")
+        self._no_sendfile = not hasattr(os, "sendfile")
+
+    def _executor(self) -> Optional[ThreadPoolExecutor]:
+        """
+        线程池（按需创建）；引擎已关闭时返回 None
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="CopyEngine")
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def copy(self, pairs: Iterable[Tuple[Path, Path]]) -> CopyResult:
+        """
+        批量复制；目标父目录不存在时自动创建
+        """
+        t0 = time.perf_counter()
+        result = CopyResult()
+        small: List[Tuple[Path, Path]] = []
+        large: List[Tuple[Path, Path, int]] = []
+        for src, dst in pairs:
+            try:
+                size = os.stat(src).st_size
+            except OSError as e:
+                result.failed += 1
+                log("copy_error: {src} -> {dst} err={err}", src=str(src), dst=str(dst), err=str(e))
+                continue
+            if self._large and size >= self._large:
+                large.append((src, dst, size))
+            else:
+                small.append((src, dst))
+        futures = []
+        pool = self._executor() if len(small) > 1 and self._workers > 1 else None
+        if pool is not None:
+            inline: List[Tuple[Path, Path]] = []
+            for src, dst in small:
+                try:
+                    futures.append((src, dst, pool.submit(self._copy_small, src, dst)))
+                except RuntimeError:
+                    # 线程池已被并发关闭：剩余文件在调用线程中复制
+                    inline.append((src, dst))
+            small = inline
+        # 大文件在调用线程中复制，与线程池中的小文件同时进行
+        for src, dst, size in large:
+            self._record(result, src, dst, lambda: self._copy_large(src, dst, size))
+        for src, dst in small:
+            self._record(result, src, dst, lambda: self._copy_small(src, dst))
+        for src, dst, fut in futures:
+            self._record(result, src, dst, fut.result)
+        result.elapsed_ms += (time.perf_counter() - t0) * 1000.0
+        if result.copied:
+            log("copy_engine_done: files={n} large={large} bytes={bytes} ms={ms} mb_per_s={rate}",
+                n=result.copied, large=len(large), bytes=result.bytes_written, ms=int(result.elapsed_ms), rate=f"{result.mb_per_s:.1f}")
+        return result
+
+    def copy_atomic(self, pairs: Iterable[Tuple[Path, Path]]) -> CopyResult:
+        """
+        原子替换复制：读者只会看到旧文件或完整的新文件，进程中途退出只会留下临时文件
+        - 全部文件先写入临时文件，再整批 fsync（并行），最后逐个 os.replace 并 fsync 涉及的目录
+        - 返回的 paths 为最终目标路径
+        """
+        pairs = list(pairs)
+        staged = [(dst, staging_path(dst)) for _, dst in pairs]
+        result = self.copy((src, tmp) for (src, _), (_, tmp) in zip(pairs, staged))
+        t0 = time.perf_counter()
+        written = set(result.paths)
+        ready = [(dst, tmp) for dst, tmp in staged if tmp in written]
+        for _, tmp in staged:
+            if tmp not in written:
+                _discard(tmp)
+        failed = self._fsync_files([tmp for _, tmp in ready])
+        result.paths = []
+        dirs: Set[Path] = set()
+        for dst, tmp in ready:
+            try:
+                if tmp in failed:
+                    raise OSError(f"fsync failed: {tmp}")
+                os.replace(tmp, dst)
+            except OSError as e:
+                _discard(tmp)
+                result.copied -= 1
+                result.failed += 1
+                log("copy_error: {src} -> {dst} err={err}", src=str(tmp), dst=str(dst), err=str(e))
+                continue
+            result.paths.append(dst)
+            dirs.add(dst.parent)
+        _fsync_dirs(dirs)
+        result.elapsed_ms += (time.perf_counter() - t0) * 1000.0
+        if result.paths:
+            log("copy_engine_atomic_done: files={n} dirs={dirs} ms={ms}", n=len(result.paths), dirs=len(dirs), ms=int(result.elapsed_ms))
+        return result
+
+    def _fsync_files(self, paths: List[Path]) -> Set[Path]:
+        """
+        批量 fsync，返回失败的路径集合
+        """
+        pool = self._executor() if len(paths) > 1 and self._workers > 1 else None
+        try:
+            oks = list(pool.map(_fsync_file, paths)) if pool is not None else None
+        except RuntimeError:
+            # 线程池已被并发关闭
+            oks = None
+        if oks is None:
+            oks = [_fsync_file(p) for p in paths]
+        return {p for p, ok in zip(paths, oks) if not ok}
+
+    def _record(self, result: CopyResult, src: Path, dst: Path, fn):
+        try:
+            n = fn()
+        except Exception as e:
+            result.failed += 1
+            log("copy_error: {src} -> {dst} err={err}", src=str(src), dst=str(dst), err=str(e))
+            return
+        result.copied += 1
+        result.bytes_written += n
+        result.paths.append(dst)
+
+    def _copy_small(self, src: Path, dst: Path) -> int:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+        return os.stat(dst).st_size
+
+    def _copy_large(self, src: Path, dst: Path, size: int) -> int:
+        """
+        依次尝试零拷贝路径，都不可用时普通读写；返回实际写入的字节数
+        """
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            sfd, dfd = fsrc.fileno(), fdst.fileno()
+            copied = self._try_reflink(sfd, dfd)
+            if copied is None:
+                copied = self._try_copy_range(sfd, dfd, size)
+            if copied is None:
+                copied = self._try_sendfile(sfd, dfd, size)
+            if copied is None:
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst, _CHUNK)
+                copied = fdst.tell()
+        shutil.copystat(src, dst)
+        return copied
+
+    def _try_reflink(self, sfd: int, dfd: int) -> Optional[int]:
+        """
+        返回克隆的字节数；不支持时返回 None
+        """
+        if not sys.platform.startswith("linux"):
+            return None
+        devs = (os.fstat(sfd).st_dev, os.fstat(dfd).st_dev)
+        if devs in self._no_reflink:
+            return None
+        try:
+            import fcntl
+            fcntl.ioctl(dfd, _FICLONE, sfd)
+            return os.fstat(dfd).st_size
+        except (OSError, ImportError) as e:
+            if isinstance(e, ImportError) or e.errno in _UNSUPPORTED:
+                self._no_reflink.add(devs)
+                return None
+            raise
+
+    def _try_copy_range(self, sfd: int, dfd: int, size: int) -> Optional[int]:
+        """
+        返回复制的字节数；不支持（或一个字节都没复制，例如 procfs 及部分 FUSE/overlay）时返回 None
+        """
+        if self._no_copy_range:
+            return None
+        offset = 0
+        try:
+            while offset < size:
+                n = os.copy_file_range(sfd, dfd, min(size - offset, 1 << 30), offset, offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError as e:
+            if e.errno in _UNSUPPORTED and offset == 0:
+                if e.errno == errno.ENOSYS:
+                    self._no_copy_range = True
+                return None
+            raise
+        return _checked_length(offset, size, "copy_file_range")
+
+    def _try_sendfile(self, sfd: int, dfd: int, size: int) -> Optional[int]:
+        """
+        返回复制的字节数；不支持或一个字节都没复制时返回 None
+        """
+        if self._no_sendfile:
+            return None
+        offset = 0
+        try:
+            while offset < size:
+                n = os.sendfile(dfd, sfd, offset, min(size - offset, 1 << 30))
+                if n == 0:
+                    break
+                offset += n
+        except OSError as e:
+            if e.errno in _UNSUPPORTED and offset == 0:
+                return None
+            raise
+        return _checked_length(offset, size, "sendfile")
+
+
+def _checked_length(offset: int, size: int, op: str) -> Optional[int]:
+    """
+    零拷贝循环结束后的结果：0 字节时交给下一种方式；复制到一半提前结束视为错误（不留下截断的目标文件）
+    """
+    if offset == 0 and size > 0:
+        return None
+    if offset < size:
+        raise OSError(errno.EIO, f"{op} stopped at {offset} of {size} bytes")
+    return offset
+
+
+def _fsync_file(path: Path) -> bool:
+    # Windows 下 FlushFileBuffers 需要写权限
+    flags = os.O_RDWR if os.name == "nt" else os.O_RDONLY
+    try:
+        fd = os.open(path, flags)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return True
+    except OSError as e:
+        log("fsync_error: {path} err={err}", path=str(path), err=str(e))
+        return False
+
+
+def _fsync_dirs(dirs: Iterable[Path]):
+    # 目录项的持久化；不支持打开目录的平台（Windows）跳过
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    for d in dirs:
+        try:
+            fd = os.open(d, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            log("fsync_error: {path} err={err}", path=str(d), err=str(e))
+
+
+def _discard(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log("staging_cleanup_error: {path} err={err}", path=str(path), err=str(e))
+
+
+_default: Optional[CopyEngine] = None
+_default_lock = threading.Lock()
+
+
+def default_engine() -> CopyEngine:
+    """
+    进程内共享的默认复制引擎
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = CopyEngine()
+        return _default
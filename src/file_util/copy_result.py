@@ -0,0 +1,61 @@
+"""
+复制结果统计
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List
+from pathlib import Path
+
+
+@dataclass
+class CopyResult:
+    """
+    一次批量复制的结果
+    - copied: 实际写入的文件数
+    - skipped: 目标已与源一致而跳过的文件数
+    - failed: 复制失败的文件数
+    - deleted: 镜像同步时删除的目标文件数
+    - linked: 增量备份时硬链接到上一份快照的文件数
+    - bytes_written: 写入的字节数
+    - elapsed_ms: 复制耗时（毫秒）
+    - paths: 实际写入的目标路径
+    - removed: 镜像同步时删除的目标路径
+    """
+    copied: int = 0
+    skipped: int = 0
+    failed: int = 0
+    deleted: int = 0
+    linked: int = 0
+    bytes_written: int = 0
+    elapsed_ms: float = 0.0
+    paths: List[Path] = field(default_factory=list)
+    removed: List[Path] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        """是否有文件被写入或删除"""
+        return self.copied > 0 or self.deleted > 0
+
+    @property
+    def mb_per_s(self) -> float:
+        """写入吞吐量（MB/s）"""
+        return self.bytes_written / 2**20 / (self.elapsed_ms / 1000.0) if self.elapsed_ms > 0 else 0.0
+
+    def merge(self, other: "CopyResult") -> "CopyResult":
+        """累加另一次复制的结果（原地修改并返回自身）"""
+        self.copied += other.copied
+        self.skipped += other.skipped
+        self.failed += other.failed
+        self.deleted += other.deleted
+        self.linked += other.linked
+        self.bytes_written += other.bytes_written
+        self.elapsed_ms += other.elapsed_ms
+        self.paths.extend(other.paths)
+        self.removed.extend(other.removed)
+        return self
+
+    def record_removed(self, paths: List[Path]) -> "CopyResult":
+        """记录删除的目标文件"""
+        self.deleted += len(paths)
+        self.removed.extend(paths)
+        return self
@@ -5,9 +5,11 @@
 - find_files: 在目录下匹配 allow 模式并排除 deny 模式，返回文件列表
 """
 from pathlib import Path
-from typing import List
-import shutil
+from typing import List, Optional
+import os
 from log_util import log
+from .path_filter import PathFilter
+from .copy_engine import CopyEngine, default_engine
 
 def ensure_dir(path: str | Path) -> Path:
     """
@@ -20,37 +22,36 @@ def ensure_dir(path: str | Path) -> Path:
     log("ensure_dir: {path} existed={existed}", path=str(p), existed=existed)
     return p
 
-def copy_files(paths: List[str | Path], target_dir: str | Path) -> List[Path]:
+def copy_files(paths: List[str | Path], target_dir: str | Path, engine: Optional[CopyEngine] = None) -> List[Path]:
     """
     将给定文件列表复制到目标目录
     - 目标目录不存在会自动创建
     - 遇到同名文件默认覆盖
     - 跳过不存在或非文件路径并记录日志
+    - engine: 复制引擎（默认使用进程内共享引擎）
     返回复制后的目标文件路径列表
     """
     dst_dir = ensure_dir(target_dir)
-    copied: List[Path] = []
+    pairs = []
     for src in paths:
         sp = Path(src)
         if not sp.is_file():
             log("skip_missing_file: {path}", path=str(sp))
             continue
-        dp = dst_dir / sp.name
-        try:
-            shutil.copy2(sp.as_posix(), dp.as_posix())
-            copied.append(dp.resolve())
-        except Exception as e:
-            log("copy_error: {src} -> {dst} err={err}", src=str(sp), dst=str(dp), err=str(e))
+        pairs.append((sp, dst_dir / sp.name))
+    result = (engine or default_engine()).copy(pairs)
+    copied = [dp.resolve() for dp in result.paths]
     log("copy_files_done: count={count} target={target}", count=len(copied), target=str(dst_dir))
     return copied
 
 def find_files(dir_path: str | Path, allow: List[str] | None = None, deny: List[str] | None = None) -> List[Path]:
     """
     在指定目录下查找文件
-    - allow: 模式数组（glob），为空则默认递归查找所有文件
-    - deny: 模式数组（glob），为空则不做排除
+    - allow: 模式数组，为空则默认递归查找所有文件
+    - deny: 模式数组，为空则不做排除
     - 返回满足条件的文件路径列表（已排序）
-    说明：支持 `**` 递归匹配；模式解析错误会记录日志但不中断
+    说明：模式按相对路径匹配，语义与 PathFilter 相同（`*` 可跨越 `/`）；只遍历一次目录树，
+    并跳过不可能包含匹配文件的子目录
     """
     root = Path(dir_path).resolve()
     if not root.exists():
@@ -58,29 +59,17 @@ def find_files(dir_path: str | Path, allow: List[str] | None = None, deny: List[
         return []
     allow = allow or []
     deny = deny or []
-    if allow:
-        allowed_set = set()
-        for pat in allow:
-            try:
-                for p in root.glob(pat):
-                    if p.is_file():
-                        allowed_set.add(p.resolve())
-            except Exception as e:
-                log("allow_pattern_error: {pattern} err={err}", pattern=str(pat), err=str(e))
-    else:
-        allowed_set = {p.resolve() for p in root.rglob("*") if p.is_file()}
-    if deny:
-        deny_set = set()
-        for pat in deny:
-            try:
-                for p in root.glob(pat):
-                    if p.is_file():
-                        deny_set.add(p.resolve())
-            except Exception as e:
-                log("deny_pattern_error: {pattern} err={err}", pattern=str(pat), err=str(e))
-        result = [p for p in allowed_set if p not in deny_set]
-    else:
-        result = list(allowed_set)
+    flt = PathFilter.of(allow, deny)
+    base = root.as_posix()
+    result: List[Path] = []
+    for cur, dirs, names in os.walk(base):
+        rel_dir = cur[len(base) + 1:].replace(os.sep, "/") if cur != base else ""
+        if not flt.is_empty:
+            dirs[:] = [d for d in dirs if flt.want_dir(f"{rel_dir}/{d}" if rel_dir else d)]
+        for name in names:
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if flt.match(rel):
+                result.append(root / rel)
     log(
         "find_files_done: root={root} allow_n={an} deny_n={dn} out_n={out}",
         root=str(root),
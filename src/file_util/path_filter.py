@@ -0,0 +1,135 @@
+"""
+allow/deny 路径过滤器
+- 模式按相对路径匹配，语义与 fnmatch 相同（`*` 可跨越 `/`）
+- 除了判断单个文件，还能判断整个目录是否可以跳过，供扫描器在 stat 之前剪枝
+- 模式只编译一次：形如 `*.sav` 的纯后缀模式用 str.endswith 判断，其余模式合并为一个正则
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Iterable, Optional, Pattern, Tuple
+import fnmatch
+import os
+import re
+
+_WILDCARDS = "*?["
+
+
+def _norm(s: str) -> str:
+    """与 fnmatch 一致的大小写/分隔符规范化（Windows 下不区分大小写）"""
+    s = s.replace("\\", "/")
+    return s.lower() if os.name == "nt" else s
+
+
+class _Matcher:
+    """
+    一组模式的编译结果：任一模式匹配即返回 True
+    - suffixes: `*` + 字面量 形式的模式（`*` 可跨越 `/`，等价于后缀判断）
+    - regex: 其余模式按 fnmatch.translate 合并后的正则
+    """
+    __slots__ = ("suffixes", "regex")
+
+    def __init__(self, patterns: Tuple[str, ...]):
+        suffixes = []
+        rest = []
+        for pat in patterns:
+            pat = _norm(pat)
+            tail = pat[1:]
+            if pat.startswith("*") and tail and not any(ch in _WILDCARDS for ch in tail):
+                suffixes.append(tail)
+            else:
+                rest.append(pat)
+        self.suffixes: Tuple[str, ...] = tuple(suffixes)
+        self.regex: Optional[Pattern[str]] = re.compile("|".join(fnmatch.translate(p) for p in rest)) if rest else None
+
+    def __call__(self, rel: str) -> bool:
+        if self.suffixes and rel.endswith(self.suffixes):
+            return True
+        return self.regex is not None and self.regex.match(rel) is not None
+
+
+@lru_cache(maxsize=256)
+def _compile(patterns: Tuple[str, ...]) -> _Matcher:
+    return _Matcher(patterns)
+
+
+def _literal_prefix(pat: str) -> str:
+    """模式中第一个通配符之前的字面量前缀"""
+    for i, ch in enumerate(pat):
+        if ch in _WILDCARDS:
+            return pat[:i]
+    return pat
+
+
+def _could_match_under(pat: str, dir_prefix: str) -> bool:
+    """
+    以 dir_prefix（以 / 结尾）开头的路径是否可能匹配 pat（保守判断，不确定时返回 True）
+    """
+    lit = _literal_prefix(pat)
+    if lit == pat:
+        return pat.startswith(dir_prefix)
+    return lit.startswith(dir_prefix) or dir_prefix.startswith(lit)
+
+
+def _covers_all_under(pat: str, dir_prefix: str) -> bool:
+    """
+    pat 是否匹配 dir_prefix 下的所有路径（形如 `logs/*`、`cache/**`）
+    """
+    lit = _literal_prefix(pat)
+    rest = pat[len(lit):]
+    return bool(rest) and set(rest) == {"*"} and dir_prefix.startswith(lit)
+
+
+@dataclass(frozen=True)
+class PathFilter:
+    """
+    路径过滤器（不可变，可比较、可作为字典键）
+    - allow: 允许模式，为空表示全部允许
+    - deny: 排除模式
+    """
+    allow: Tuple[str, ...] = ()
+    deny: Tuple[str, ...] = ()
+
+    @classmethod
+    def of(cls, allow: Iterable[str] | None = None, deny: Iterable[str] | None = None) -> "PathFilter":
+        return cls(allow=tuple(allow or ()), deny=tuple(deny or ()))
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.allow and not self.deny
+
+    @cached_property
+    def _allow_matcher(self) -> _Matcher:
+        return _compile(self.allow)
+
+    @cached_property
+    def _deny_matcher(self) -> _Matcher:
+        return _compile(self.deny)
+
+    def match(self, rel: str) -> bool:
+        """
+        文件相对路径（posix 形式）是否通过过滤
+        """
+        if not self.allow and not self.deny:
+            return True
+        rel = _norm(rel) if os.name == "nt" else rel
+        if self.allow and not self._allow_matcher(rel):
+            return False
+        if self.deny and self._deny_matcher(rel):
+            return False
+        return True
+
+    def want_dir(self, rel_dir: str) -> bool:
+        """
+        目录（相对路径，posix 形式）下是否可能存在通过过滤的文件
+        - 没有任何 allow 模式可能匹配该目录下的路径：跳过
+        - 某个 deny 模式覆盖该目录下的全部路径：跳过
+        """
+        if not rel_dir:
+            return True
+        prefix = _norm(rel_dir.rstrip("/") + "/")
+        if self.allow and not any(_could_match_under(_norm(pat), prefix) for pat in self.allow):
+            return False
+        if self.deny and any(_covers_all_under(_norm(pat), prefix) for pat in self.deny):
+            return False
+        return True
@@ -2,6 +2,9 @@
 Git 工具模块
 """
 from .git_repo import GitRepo
+from .backend import GitBackend
+from .subprocess_backend import SubprocessBackend
+from .dulwich_backend import DulwichBackend, dulwich_available
 from .factory import create_git
 
-__all__ = ["GitRepo", "create_git"]
+__all__ = ["GitRepo", "GitBackend", "SubprocessBackend", "DulwichBackend", "dulwich_available", "create_git"]
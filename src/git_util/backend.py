@@ -0,0 +1,44 @@
+"""
+Git 后端接口
+- GitRepo 负责加锁、日志与配置缓存，具体的提交、状态、拉取与推送交给后端执行
+- 后端方法均在 GitRepo 的锁内调用，不需要自行加锁
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .git_repo import GitRepo
+
+
+class GitBackend:
+    """
+    Git 后端基类
+    - head(): 当前 HEAD 提交；尚无提交时返回空串
+    - has_staged_changes(): 索引与 HEAD 是否不同
+    - commit_paths(rels, message): 只提交给定路径；返回 True（已提交）/ False（无变化）/ None（失败）
+    - remote_tip(): 远端分支最新提交；分支不存在时返回空串，查询失败返回 None
+    - fetch(): 拉取远端分支并更新 origin/<branch>，返回 (成功, 错误信息)
+    - push(): 以 origin/<branch> 为租约强制推送，返回 (成功, 错误信息)
+    """
+    name = ""
+
+    def __init__(self, repo: "GitRepo"):
+        self.repo = repo
+
+    def head(self) -> str:
+        raise NotImplementedError
+
+    def has_staged_changes(self) -> bool:
+        raise NotImplementedError
+
+    def commit_paths(self, rels: List[str], message: str) -> Optional[bool]:
+        raise NotImplementedError
+
+    def remote_tip(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def fetch(self) -> Tuple[bool, str]:
+        raise NotImplementedError
+
+    def push(self) -> Tuple[bool, str]:
+        raise NotImplementedError
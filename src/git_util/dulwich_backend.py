@@ -0,0 +1,165 @@
+"""
+进程内 Git 后端（基于 dulwich，可选依赖）
+- 提交、状态、拉取、推送在进程内完成，不启动 git 子进程
+- 仅本地远端（file:// 或本地路径）走进程内传输；其他远端及任何进程内失败都退回子进程实现
+- reset / clean / gc / 历史压缩等维护操作仍由 GitRepo 通过子进程执行
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Optional, Tuple
+import io
+import re
+from log_util import log
+from .subprocess_backend import SubprocessBackend
+
+try:
+    from dulwich import porcelain
+    from dulwich.repo import Repo
+    _DULWICH = True
+except ImportError:
+    _DULWICH = False
+
+
+def dulwich_available() -> bool:
+    """
+    是否已安装 dulwich
+    """
+    return _DULWICH
+
+
+class DulwichBackend(SubprocessBackend):
+    """
+    dulwich 后端
+    - 每次操作重新打开仓库：外部 git 进程（reset、gc）改写的引用与打包文件总能被看到
+    - 提交不运行钩子，与 commit-tree 一致
+    """
+    name = "dulwich"
+
+    def _open(self) -> "Repo":
+        return Repo(str(self.repo.repo_dir))
+
+    def _local_remote(self) -> Optional[str]:
+        """
+        本地远端的绝对路径；非本地远端返回 None
+        """
+        url = self.repo.remote
+        if url.startswith("file://"):
+            path = url[len("file://"):]
+        elif "://" in url or (re.match(r"^[^/\\]+:", url) and not re.match(r"^[A-Za-z]:[\\/]", url)):
+            # https / ssh 以及 scp 风格的 user@host:path
+            return None
+        else:
+            path = url
+        p = Path(path)
+        if not p.is_absolute():
+            # 与 git 一致：相对路径相对仓库目录解析
+            p = self.repo.repo_dir / p
+        return str(p) if p.is_dir() else None
+
+    def _fallback(self, op: str, e: Exception):
+        log("git_backend_fallback: backend=dulwich op={op} err={err}", op=op, err=str(e))
+
+    def _identity(self) -> bytes:
+        config = self.repo._local_config()
+        return f"{config.get('user.name', 'game-save-sync')} <{config.get('user.email', 'game-save-sync@local')}>".encode("utf-8")
+
+    def head(self) -> str:
+        try:
+            with self._open() as r:
+                try:
+                    return r.head().decode("ascii")
+                except KeyError:
+                    return ""
+        except Exception as e:
+            self._fallback("head", e)
+            return super().head()
+
+    def has_staged_changes(self) -> bool:
+        try:
+            with self._open() as r:
+                tree = r.open_index().commit(r.object_store)
+                try:
+                    return tree != r[r.head()].tree
+                except KeyError:
+                    return len(r.open_index()) > 0
+        except Exception as e:
+            self._fallback("status", e)
+            return super().has_staged_changes()
+
+    def commit_paths(self, rels: List[str], message: str) -> Optional[bool]:
+        try:
+            with self._open() as r:
+                # 新版本通过工作树暂存与提交，旧版本直接在 Repo 上
+                worktree = r.get_worktree() if hasattr(r, "get_worktree") else r
+                # 不存在的文件从索引移除
+                worktree.stage(rels)
+                tree = r.open_index().commit(r.object_store)
+                try:
+                    head_tree = r[r.head()].tree
+                except KeyError:
+                    head_tree = None
+                if tree == head_tree:
+                    return False
+                identity = self._identity()
+                opts = dict(message=message.encode("utf-8"), committer=identity, author=identity, tree=tree, no_verify=True)
+                if hasattr(worktree, "commit"):
+                    worktree.commit(**opts)
+                else:
+                    r.do_commit(**opts)
+                return True
+        except Exception as e:
+            self._fallback("commit", e)
+            return super().commit_paths(rels, message)
+
+    def remote_tip(self) -> Optional[str]:
+        path = self._local_remote()
+        if path is None:
+            return super().remote_tip()
+        try:
+            result = porcelain.ls_remote(path)
+        except Exception as e:
+            self._fallback("ls-remote", e)
+            return super().remote_tip()
+        # 新版本返回 LsRemoteResult，旧版本直接返回引用字典
+        refs = getattr(result, "refs", result)
+        tip = refs.get(f"refs/heads/{self.repo.branch}".encode("utf-8"))
+        return tip.decode("ascii") if tip else ""
+
+    def fetch(self) -> Tuple[bool, str]:
+        path = self._local_remote()
+        if path is None:
+            return super().fetch()
+        branch = self.repo.branch.encode("utf-8")
+        try:
+            with self._open() as r:
+                result = porcelain.fetch(r, path, errstream=io.BytesIO())
+                refs = getattr(result, "refs", result)
+                tip = refs.get(b"refs/heads/" + branch)
+                if not tip:
+                    return False, f"couldn't find remote ref {self.repo.branch}"
+                r.refs[b"refs/remotes/origin/" + branch] = tip
+                return True, ""
+        except Exception as e:
+            self._fallback("fetch", e)
+            return super().fetch()
+
+    def push(self) -> Tuple[bool, str]:
+        path = self._local_remote()
+        if path is None:
+            return super().push()
+        tip = self.remote_tip()
+        if tip is None:
+            return False, "ls-remote failed"
+        # 模拟 --force-with-lease：远端分支必须仍是本地记录的 origin/<branch>
+        tracked = self.repo._read_ref(f"refs/remotes/origin/{self.repo.branch}")
+        if tip != tracked:
+            return False, f"stale info: remote={tip[:12]} tracked={tracked[:12]}"
+        ref = f"refs/heads/{self.repo.branch}".encode("utf-8")
+        try:
+            with self._open() as r:
+                porcelain.push(r, path, refspecs=[ref], force=True, outstream=io.BytesIO(), errstream=io.BytesIO())
+                r.refs[b"refs/remotes/origin/" + ref[len(b"refs/heads/"):]] = r.refs[ref]
+                return True, ""
+        except Exception as e:
+            self._fallback("push", e)
+            return super().push()
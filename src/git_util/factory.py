@@ -7,16 +7,31 @@ import threading
 from log_util import log
 from .git_repo import GitRepo
 from .git_helpers import redact_token
+from .subprocess_backend import SubprocessBackend
+from .dulwich_backend import DulwichBackend, dulwich_available
 
+# 可选后端：subprocess（git 命令行）/ dulwich（进程内，需要安装 dulwich）
+GIT_BACKENDS = ("subprocess", "dulwich")
 
-def create_git(remote: str, repo_dir: str | Path, branch: str = "main", token: Optional[str] = None, username: Optional[str] = None) -> GitRepo:
+
+def create_git(remote: str, repo_dir: str | Path, branch: str = "main", token: Optional[str] = None, username: Optional[str] = None, backend: str = "subprocess") -> GitRepo:
     """
     创建 Git 实例并返回
     - remote: 远端地址（可为空）
     - repo_dir: 仓库目录
     - branch: 分支名
     - token: 可选令牌（仅用于构造远端地址，日志中会打码）
+    - backend: subprocess / dulwich；dulwich 未安装时回退为 subprocess
     """
     rp = Path(repo_dir).resolve()
-    log("git_instance_create: path={path} branch={branch} remote={remote}", path=str(rp), branch=branch, remote=redact_token(remote, token or None))
-    return GitRepo(repo_dir=rp, remote=remote or "", branch=branch or "main", token=token, username=username, _lock=threading.Lock())
+    name = (backend or "subprocess").strip().lower()
+    if name not in GIT_BACKENDS:
+        log("git_backend_unknown: {backend} fallback=subprocess", backend=backend)
+        name = "subprocess"
+    if name == "dulwich" and not dulwich_available():
+        log("git_backend_unavailable: dulwich fallback=subprocess")
+        name = "subprocess"
+    log("git_instance_create: path={path} branch={branch} remote={remote} backend={backend}", path=str(rp), branch=branch, remote=redact_token(remote, token or None), backend=name)
+    repo = GitRepo(repo_dir=rp, remote=remote or "", branch=branch or "main", token=token, username=username, _lock=threading.Lock())
+    repo.backend = DulwichBackend(repo) if name == "dulwich" else SubprocessBackend(repo)
+    return repo
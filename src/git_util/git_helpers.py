@@ -5,7 +5,7 @@ import subprocess
 import shlex
 import os
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List
 from log_util import log
 
 
@@ -16,12 +16,15 @@ def redact_token(s: str, token: Optional[str]) -> str:
     return s
 
 
-def run_git_command(cmd: List[str], cwd: Path, token: Optional[str] = None) -> Tuple[int, str, str]:
+def run_git_command(cmd: List[str], cwd: Path, token: Optional[str] = None, input: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
     """
     运行 git 命令，返回 (code, stdout, stderr)，禁用交互
+    - input: 写入标准输入的内容（用于 --stdin-paths / --index-info 等批量接口）
+    - env: 额外的环境变量（例如改写历史时保留作者与日期）
     """
     env = {
         **os.environ,
+        **(env or {}),
         "GIT_TERMINAL_PROMPT": "0",
         "GCM_INTERACTIVE": "Never",
         "GIT_ASKPASS": "echo",
@@ -31,6 +34,7 @@ def run_git_command(cmd: List[str], cwd: Path, token: Optional[str] = None) -> T
             cmd,
             cwd=str(cwd),
             capture_output=True,
+            input=input,
             text=True,
             env=env,
             creationflags=(0x08000000 if os.name == "nt" else 0),
@@ -2,12 +2,24 @@
 Git 仓库封装类
 """
 from __future__ import annotations
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import threading
+import time
 from log_util import log
 from .git_helpers import run_git_command, redact_token
+from .backend import GitBackend
+from .subprocess_backend import SubprocessBackend
+
+
+# gc 回收不可达对象的宽限期：gc 不持有仓库锁，宽限期内新写入、尚未被引用的对象不会被删除
+_PRUNE_GRACE = "1.hour.ago"
+# 历史压缩时读取的提交字段（--date=raw；字段以 \x1f 分隔，提交以 NUL 分隔）
+_LOG_FORMAT = "%H%x1f%T%x1f%an%x1f%ae%x1f%ad%x1f%cn%x1f%ce%x1f%cd%x1f%ct%x1f%B"
+# 仓库固定使用的本地配置
+_IDENTITY = (("user.name", "game-save-sync"), ("user.email", "game-save-sync@local"), ("credential.helper", ""))
 
 
 @dataclass
@@ -19,6 +31,11 @@ class GitRepo:
     - branch: 分支名（默认 main）
     - token: 令牌（仅用于构造远端地址；不记录到日志）
     - 所有操作均加锁，保证并发安全
+    - last_pull: 最近一次成功 force_pull 的 (拉取前 HEAD, 拉取后 HEAD, 拉取前的 origin/<branch>)；为空表示当时没有提交或引用。
+      拉取前 HEAD 与 origin/<branch> 不同说明本地有未推送的提交，不能以 HEAD 为差异基准
+    - 本地配置（origin 地址、用户身份、upstream）只读取一次并缓存已确认的状态，与期望一致时不再执行 git
+    - spawned: 累计启动的 git 进程数；cycle(name) 统计并记录一次同步周期内当前线程启动的进程数
+    - backend: 执行提交、状态、拉取与推送的后端（默认子进程后端）
     """
     repo_dir: Path
     remote: str
@@ -26,13 +43,108 @@ class GitRepo:
     token: Optional[str]
     username: Optional[str]
     _lock: threading.Lock
+    last_pull: Optional[Tuple[str, str, str]] = None
+    spawned: int = 0
+    _config: Optional[Dict[str, str]] = None
+    _cycle: threading.local = field(default_factory=threading.local)
+    backend: Optional[GitBackend] = None
+
+    def __post_init__(self):
+        if self.backend is None:
+            self.backend = SubprocessBackend(self)
+
+    def _count_spawn(self):
+        self.spawned += 1
+        self._cycle.count = getattr(self._cycle, "count", 0) + 1
+
+    def _git(self, *args: str, input: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+        self._count_spawn()
+        return run_git_command(["git", *args], cwd=self.repo_dir, token=self.token, input=input, env=env)
+
+    @contextmanager
+    def cycle(self, name: str) -> Iterator[None]:
+        """
+        统计一次同步周期（当前线程）启动的 git 进程数，结束时记录日志
+        """
+        self._cycle.count = 0
+        try:
+            yield
+        finally:
+            log("git_cycle_spawns: cycle={name} spawns={n} total={total}", name=name, n=getattr(self._cycle, "count", 0), total=self.spawned)
+
+    def _local_config(self) -> Dict[str, str]:
+        """
+        仓库本地配置（首次调用时读取一次并缓存）；读取失败时返回空表且不缓存
+        """
+        if self._config is None:
+            code, out, _ = self._git("config", "--local", "--list", "-z")
+            if code != 0:
+                return {}
+            config: Dict[str, str] = {}
+            for item in out.split("\0"):
+                if item:
+                    key, _, value = item.partition("\n")
+                    config[key] = value
+            self._config = config
+        return self._config
+
+    def _ensure_config(self, key: str, value: str) -> bool:
+        """
+        确保本地配置项为期望值；缓存中已一致时不启动 git
+        """
+        config = self._local_config()
+        if config.get(key) == value:
+            return True
+        code, _, _ = self._git("config", key, value)
+        if code == 0:
+            config[key] = value
+        return code == 0
+
+    def _read_ref(self, ref: str) -> str:
+        """
+        直接读取引用（松散引用文件或 packed-refs），不启动 git；不存在时返回空串
+        """
+        git_dir = self.repo_dir / ".git"
+        try:
+            return (git_dir / ref).read_text(encoding="utf-8").strip()
+        except OSError:
+            pass
+        try:
+            with open(git_dir / "packed-refs", "r", encoding="utf-8") as f:
+                for line in f:
+                    oid, _, name = line.strip().partition(" ")
+                    if name == ref:
+                        return oid
+        except OSError:
+            pass
+        return ""
+
+    def _remote_moved(self) -> Optional[bool]:
+        """
+        用 ls-remote 查询远端分支最新提交，与本地缓存的 origin/<branch> 比较
+        返回 True/False；查询失败时返回 None（调用方应照常拉取）
+        """
+        remote_tip = self.backend.remote_tip()
+        if remote_tip is None:
+            return None
+        tracked = self._read_ref(f"refs/remotes/origin/{self.branch}")
+        log("git_probe: branch={branch} remote={remote} tracked={tracked}", branch=self.branch, remote=remote_tip[:12], tracked=tracked[:12])
+        return remote_tip != tracked
 
-    def _git(self, *args: str) -> Tuple[int, str, str]:
-        return run_git_command(["git", *args], cwd=self.repo_dir, token=self.token)
+    def _current_branch(self) -> str:
+        # 直接读取 .git/HEAD，避免为此启动 git
+        try:
+            head = (self.repo_dir / ".git" / "HEAD").read_text(encoding="utf-8").strip()
+        except OSError:
+            return ""
+        return head[len("ref: refs/heads/"):] if head.startswith("ref: refs/heads/") else ""
 
     def _ensure_repo_dir(self):
         self.repo_dir.mkdir(parents=True, exist_ok=True)
 
+    def _head(self) -> str:
+        return self.backend.head()
+
     def _is_dir_empty(self, p: Path) -> bool:
         if not p.exists():
             return True
@@ -52,9 +164,8 @@ class GitRepo:
         return url
 
     def _set_user(self):
-        self._git("config", "user.name", "game-save-sync")
-        self._git("config", "user.email", "game-save-sync@local")
-        self._git("config", "credential.helper", "")
+        for key, value in _IDENTITY:
+            self._ensure_config(key, value)
 
     def ensure_cloned(self):
         """
@@ -67,6 +178,7 @@ class GitRepo:
             self._ensure_repo_dir()
             git_dir = self.repo_dir / ".git"
             if not git_dir.exists():
+                self._config = None
                 if self.remote:
                     url = self._embed_token(self.remote)
                     # 仅当目录不存在或为空时执行 clone；为空时清理目录避免 clone 报错
@@ -77,6 +189,7 @@ class GitRepo:
                                 self.repo_dir.rmdir()
                         except Exception:
                             pass
+                        self._count_spawn()
                         code, _, err = run_git_command(["git", "clone", "--quiet", url, str(self.repo_dir)], cwd=self.repo_dir.parent, token=self.token)
                     else:
                         code, _, err = (1, "", "destination not empty")
@@ -90,32 +203,50 @@ class GitRepo:
                         log("git_init_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
                         return False
                     log("git_init_ok: path={path}", path=str(self.repo_dir))
-            # 写入/更新 origin
+            # 写入/更新 origin（与已有地址一致时不做任何操作）
             if self.remote:
                 url = self._embed_token(self.remote)
-                self._git("remote", "remove", "origin")
-                self._git("remote", "add", "origin", url)
-            # 切换分支（若不存在则创建）
-            code, _, _ = self._git("rev-parse", "--verify", self.branch)
-            if code != 0:
-                self._git("checkout", "-b", self.branch)
-            else:
-                self._git("checkout", self.branch)
+                config = self._local_config()
+                current = config.get("remote.origin.url")
+                if current != url:
+                    if current is None:
+                        code, _, _ = self._git("remote", "add", "origin", url)
+                    else:
+                        code, _, _ = self._git("remote", "set-url", "origin", url)
+                    if code == 0:
+                        config["remote.origin.url"] = url
+                        config.setdefault("remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*")
+            # 切换分支（若不存在则创建；已在该分支时跳过）
+            if self._current_branch() != self.branch:
+                code, _, _ = self._git("rev-parse", "--verify", self.branch)
+                if code != 0:
+                    self._git("checkout", "-b", self.branch)
+                else:
+                    self._git("checkout", self.branch)
             self._set_user()
             return True
 
-    def force_pull(self):
+    def force_pull(self, probe: bool = False):
         """
         强制拉取远端：fetch + reset --hard + clean -fdx
         - 若未配置 remote，直接跳过
+        - probe=True 时先用 ls-remote 探测远端分支；未移动则跳过拉取（last_pull 的新旧 HEAD 相同）
+        - fetch 前记录 origin/<branch>，作为上次同步的远端状态（last_pull[2]）
         """
         with self._lock:
+            self.last_pull = None
             if not self.remote:
                 log("git_pull_skip_remote_missing: {path}", path=str(self.repo_dir))
                 return False
             self._ensure_repo_dir()
-            code, _, err = self._git("fetch", "origin", self.branch, "--quiet")
-            if code != 0:
+            old_head = self._head()
+            old_remote = self._read_ref(f"refs/remotes/origin/{self.branch}")
+            if probe and self._remote_moved() is False:
+                self.last_pull = (old_head, old_head, old_remote)
+                log("git_pull_skip_remote_unchanged: path={path} branch={branch}", path=str(self.repo_dir), branch=self.branch)
+                return True
+            ok, err = self.backend.fetch()
+            if not ok:
                 log("git_pull_fail_fetch: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
                 return False
             code, _, err = self._git("reset", "--hard", f"origin/{self.branch}")
@@ -123,9 +254,28 @@ class GitRepo:
                 log("git_pull_fail_reset: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
                 return False
             self._git("clean", "-fdx")
-            log("git_pull_ok: path={path} branch={branch}", path=str(self.repo_dir), branch=self.branch)
+            new_head = self._head()
+            self.last_pull = (old_head, new_head, old_remote)
+            log("git_pull_ok: path={path} branch={branch} old={old} new={new}", path=str(self.repo_dir), branch=self.branch, old=old_head[:12], new=new_head[:12])
             return True
 
+    def diff_name_status(self, old: str, new: str) -> Optional[List[Tuple[str, str]]]:
+        """
+        两个提交之间变化的文件：[(状态, 仓库相对路径)]，状态为 A/M/D/T 等（不检测重命名）
+        - 失败时返回 None（调用方应退回全量处理）
+        """
+        with self._lock:
+            code, out, err = self._git("diff", "--name-status", "--no-renames", "-z", old, new)
+            if code != 0:
+                log("git_diff_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
+                return None
+            parts = out.split("\0")
+            changes: List[Tuple[str, str]] = []
+            for i in range(0, len(parts) - 1, 2):
+                if parts[i]:
+                    changes.append((parts[i][0], parts[i + 1]))
+            return changes
+
     def add(self, paths: Optional[List[str | Path]] = None):
         """
         添加变更：paths 为空则 add -A
@@ -142,12 +292,12 @@ class GitRepo:
             return True
 
     def _has_changes(self) -> bool:
-        code, out, _ = self._git("status", "--porcelain")
-        return code == 0 and bool(out.strip())
+        return self.backend.has_staged_changes()
 
-    def commit(self, message: str):
+    def commit(self, message: str) -> Optional[bool]:
         """
         提交变更：若无变更则跳过
+        - 返回 True（已提交）/ False（无变化）/ None（失败）
         """
         with self._lock:
             self._ensure_repo_dir()
@@ -158,10 +308,120 @@ class GitRepo:
             code, _, err = self._git("commit", "-m", message)
             if code != 0:
                 log("git_commit_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
-                return False
+                return None
             log("git_commit_ok: path={path} msg={msg}", path=str(self.repo_dir), msg=message)
             return True
 
+    def commit_paths(self, paths: List[str | Path], message: str) -> Optional[bool]:
+        """
+        只提交给定的仓库相对路径，不扫描工作区（子进程后端走 hash-object/update-index/write-tree/commit-tree/update-ref）
+        - 存在的文件写入对象并更新索引，不存在的文件从索引移除
+        - 返回 True（已提交）/ False（生成的树与 HEAD 一致，无变化）/ None（失败，后端已记录 git_commit_fail）
+        """
+        with self._lock:
+            self._ensure_repo_dir()
+            rels = sorted({Path(p).as_posix() for p in paths})
+            if not rels:
+                return False
+            self._set_user()
+            committed = self.backend.commit_paths(rels, message)
+            if committed is None:
+                return None
+            if not committed:
+                log("git_commit_skip_no_changes: {path}", path=str(self.repo_dir))
+                return False
+            log("git_commit_ok: path={path} msg={msg} files={n}", path=str(self.repo_dir), msg=message, n=len(rels))
+            return True
+
+    def repo_size(self) -> int:
+        """
+        本地对象库占用的字节数（git count-objects -v 的 size + size-pack + size-garbage）
+        """
+        code, out, _ = self._git("count-objects", "-v")
+        if code != 0:
+            return 0
+        kib = 0
+        for line in out.splitlines():
+            key, _, value = line.partition(":")
+            if key in ("size", "size-pack", "size-garbage"):
+                kib += int(value.strip() or 0)
+        return kib * 1024
+
+    def compact_history(self, keep_commits: int = 0, keep_days: int = 0) -> bool:
+        """
+        压缩历史：保留最近 keep_commits 个提交或 keep_days 天内的提交（满足其一即保留），
+        更早的历史合并为一个根提交，保留的提交按原作者、日期与说明重放
+        - 只改写本地分支；调用方随后强制推送。无需压缩或失败时返回 False
+        - 推送后远端历史被改写：其他设备须先拉取（reset 到新历史）再推送；拉取前基于旧历史的推送
+          会因租约不符被拒绝，随后的拉取以远端为准并重新全量同步本地文件。调用方应先用 remote_is_current() 确认
+        """
+        with self._lock:
+            if keep_commits <= 0 and keep_days <= 0:
+                return False
+            code, out, err = self._git("log", "--first-parent", "-z", "--date=raw", f"--format={_LOG_FORMAT}", "HEAD")
+            if code != 0:
+                log("git_compact_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
+                return False
+            # 从新到旧
+            rows = [rec.split("\x1f", 9) for rec in out.split("\0") if rec.strip()]
+            now = time.time()
+            keep = 0
+            for i, row in enumerate(rows):
+                if (keep_commits > 0 and i < keep_commits) or (keep_days > 0 and now - int(row[8]) <= keep_days * 86400):
+                    keep = i + 1
+                else:
+                    break
+            keep = max(keep, 1)
+            # 只有一个更早的提交时合并前后相同，不必改写
+            if keep + 1 >= len(rows):
+                log("git_compact_skip: path={path} commits={n} keep={keep}", path=str(self.repo_dir), n=len(rows), keep=keep)
+                return False
+            old_head = rows[0][0]
+            base = rows[keep]
+            parent = ""
+            for row in [base] + rows[:keep][::-1]:
+                _, tree, an, ae, ad, cn, ce, cd, _, body = row
+                message = f"squashed history up to {base[0][:12]} ({len(rows) - keep} commits)\n" if row is base else body
+                env = {"GIT_AUTHOR_NAME": an, "GIT_AUTHOR_EMAIL": ae, "GIT_AUTHOR_DATE": ad,
+                       "GIT_COMMITTER_NAME": cn, "GIT_COMMITTER_EMAIL": ce, "GIT_COMMITTER_DATE": cd}
+                args = ["commit-tree", tree, "-F", "-"] + (["-p", parent] if parent else [])
+                code, out, err = self._git(*args, input=message, env=env)
+                if code != 0 or not out.strip():
+                    log("git_compact_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
+                    return False
+                parent = out.strip()
+            code, _, err = self._git("update-ref", "-m", "compact history", "HEAD", parent, old_head)
+            if code != 0:
+                log("git_compact_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
+                return False
+            log("git_compact_ok: path={path} commits_before={before} commits_after={after}", path=str(self.repo_dir), before=len(rows), after=keep + 1)
+            return True
+
+    def remote_is_current(self) -> bool:
+        """
+        远端分支、本地 origin/<branch> 与 HEAD 是否一致（ls-remote 探测）：
+        其他设备自上次同步后没有推送，本地也没有未推送的提交；改写历史前以此确认
+        """
+        with self._lock:
+            if not self.remote:
+                return False
+            tip = self.backend.remote_tip()
+            return bool(tip) and tip == self._read_ref(f"refs/remotes/origin/{self.branch}") == self._head()
+
+    def maintain(self):
+        """
+        本地仓库维护：清空 reflog 后 gc，回收早于宽限期的不可达对象（压缩历史后旧提交的对象在此释放）
+        - 只有 reflog expire 持有仓库锁；gc 在锁外运行，不阻塞同时进行的拉取、提交与推送
+        - 宽限期内的对象（并发提交刚写入的对象，以及刚压缩掉的近期提交）留到下一次维护再回收
+        """
+        with self._lock:
+            self._git("reflog", "expire", "--expire=now", "--all")
+        code, _, err = self._git("gc", f"--prune={_PRUNE_GRACE}", "--quiet")
+        if code != 0:
+            log("git_gc_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
+            return False
+        return True
+
     def force_push(self):
         """
         强制推送：push --force-with-lease
@@ -172,10 +432,15 @@ class GitRepo:
                 log("git_push_skip_remote_missing: {path}", path=str(self.repo_dir))
                 return False
             self._ensure_repo_dir()
-            # 确保 upstream
-            self._git("branch", "--set-upstream-to", f"origin/{self.branch}", self.branch)
-            code, _, err = self._git("push", "--force-with-lease", "origin", self.branch)
-            if code != 0:
+            # 确保 upstream（已确认时跳过；远端分支尚不存在时设置失败，推送后下次再设置）
+            config = self._local_config()
+            if config.get(f"branch.{self.branch}.remote") != "origin" or config.get(f"branch.{self.branch}.merge") != f"refs/heads/{self.branch}":
+                code, _, _ = self._git("branch", "--set-upstream-to", f"origin/{self.branch}", self.branch)
+                if code == 0:
+                    config[f"branch.{self.branch}.remote"] = "origin"
+                    config[f"branch.{self.branch}.merge"] = f"refs/heads/{self.branch}"
+            ok, err = self.backend.push()
+            if not ok:
                 log("git_push_fail: path={path} err={err}", path=str(self.repo_dir), err=redact_token(err.strip(), self.token))
                 return False
             log("git_push_ok: path={path} branch={branch}", path=str(self.repo_dir), branch=self.branch)
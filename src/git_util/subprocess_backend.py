@@ -0,0 +1,96 @@
+"""
+子进程 Git 后端：每个操作调用 git 命令行
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import os
+from log_util import log
+from .backend import GitBackend
+from .git_helpers import redact_token
+
+
+class SubprocessBackend(GitBackend):
+    """
+    子进程后端（默认）
+    - 提交走底层命令：hash-object -w --stdin-paths -> update-index --index-info -> write-tree -> commit-tree -> update-ref
+    - 适用于任意远端地址（https / ssh / 本地路径）
+    """
+    name = "subprocess"
+
+    def _fail(self, event: str, err: str):
+        log(event + ": path={path} err={err}", path=str(self.repo.repo_dir), err=redact_token(err.strip(), self.repo.token))
+
+    def head(self) -> str:
+        code, out, _ = self.repo._git("rev-parse", "--verify", "--quiet", "HEAD")
+        return out.strip() if code == 0 else ""
+
+    def has_staged_changes(self) -> bool:
+        # 只看索引与 HEAD 的差异：暂存之外的工作区文件不影响提交，也不必扫描未跟踪文件
+        code, _, _ = self.repo._git("diff", "--cached", "--quiet")
+        return code == 1
+
+    def commit_paths(self, rels: List[str], message: str) -> Optional[bool]:
+        repo = self.repo
+        present: List[Tuple[str, int]] = []
+        missing: List[str] = []
+        for rel in rels:
+            try:
+                present.append((rel, os.stat(repo.repo_dir / rel).st_mode))
+            except FileNotFoundError:
+                missing.append(rel)
+        entries: List[str] = []
+        if present:
+            code, out, err = repo._git("hash-object", "-w", "--stdin-paths", input="\n".join(rel for rel, _ in present) + "\n")
+            oids = out.split()
+            if code != 0 or len(oids) != len(present):
+                self._fail("git_commit_fail", err)
+                return None
+            # core.filemode = false（Windows 等）时不根据文件权限推断可执行位
+            filemode = repo._local_config().get("core.filemode", "true") != "false"
+            for (rel, mode), oid in zip(present, oids):
+                entries.append(f"{'100755' if filemode and mode & 0o111 else '100644'} {oid}\t{rel}")
+        null_oid = "0" * (64 if repo._local_config().get("extensions.objectformat") == "sha256" else 40)
+        entries.extend(f"0 {null_oid}\t{rel}" for rel in missing)
+        code, _, err = repo._git("update-index", "-z", "--index-info", input="\0".join(entries) + "\0")
+        if code != 0:
+            self._fail("git_commit_fail", err)
+            return None
+        code, out, err = repo._git("write-tree")
+        tree = out.strip()
+        if code != 0 or not tree:
+            self._fail("git_commit_fail", err)
+            return None
+        # HEAD 与其树一次取回；尚无提交时为空
+        code, out, _ = repo._git("rev-parse", "HEAD", "HEAD^{tree}")
+        head, head_tree = out.split()[:2] if code == 0 and len(out.split()) >= 2 else ("", "")
+        if tree == head_tree:
+            return False
+        args = ["commit-tree", tree, "-m", message]
+        if head:
+            args += ["-p", head]
+        code, out, err = repo._git(*args)
+        commit = out.strip()
+        if code != 0 or not commit:
+            self._fail("git_commit_fail", err)
+            return None
+        # 以原 HEAD 作为期望旧值，防止覆盖并发产生的提交
+        code, _, err = repo._git("update-ref", "-m", f"commit: {message}", "HEAD", commit, head)
+        if code != 0:
+            self._fail("git_commit_fail", err)
+            return None
+        return True
+
+    def remote_tip(self) -> Optional[str]:
+        code, out, err = self.repo._git("ls-remote", "origin", f"refs/heads/{self.repo.branch}")
+        if code != 0:
+            self._fail("git_probe_fail", err)
+            return None
+        return out.split()[0] if out.strip() else ""
+
+    def fetch(self) -> Tuple[bool, str]:
+        code, _, err = self.repo._git("fetch", "origin", self.repo.branch, "--quiet")
+        return code == 0, err
+
+    def push(self) -> Tuple[bool, str]:
+        code, _, err = self.repo._git("push", "--force-with-lease", "origin", self.repo.branch)
+        return code == 0, err
@@ -2,6 +2,7 @@
 程序入口
 - 解析命令行参数（允许覆盖 remote/token/branch）
 - 启动主流程（备份/拉取/覆盖/推送/定时器/监控器）
+- restore 子命令：列出或恢复备份快照
 """
 import argparse
 from sync_util import SyncApp
@@ -14,8 +15,24 @@ def main():
     parser.add_argument("--username", type=str, default=None, help="覆盖配置中的 Git 用户名")
     parser.add_argument("--branch", type=str, default=None, help="覆盖配置中的 Git 分支名")
     parser.add_argument("--no-config-watch", action="store_true", help="禁用配置文件热重载（默认启用）")
+    sub = parser.add_subparsers(dest="command")
+    p_restore = sub.add_parser("restore", help="从备份快照恢复存档")
+    p_restore.add_argument("snapshot", nargs="?", default=None, help="快照名（默认最新）")
+    p_restore.add_argument("--game", action="append", default=None, help="只恢复指定游戏（游戏名或 游戏名/index，可重复）")
+    p_restore.add_argument("--to", type=str, default=None, help="恢复到该目录下的 <游戏名>/<index>/（默认恢复到配置中的游戏目录）")
+    p_restore.add_argument("--list", action="store_true", help="列出全部备份快照")
     args = parser.parse_args()
 
+    if args.command == "restore":
+        app = SyncApp(enable_config_watch=False)
+        if args.list:
+            for name in app.list_backups():
+                print(name)
+            return
+        count = app.restore_backup(args.snapshot, games=args.game, to=args.to)
+        print(f"restored {count} files")
+        return
+
     app = SyncApp(
         override_remote=args.remote,
         override_token=args.token,
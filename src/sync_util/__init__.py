@@ -2,6 +2,9 @@
 同步工具模块
 """
 from .sync_app import SyncApp
-from .helpers import copy_preserve_tree, filter_paths_by_patterns, compute_files_hash, get_timestamp
+from .digest_cache import DigestCache
+from .backup_store import BackupStore
+from .backup_pruner import BackupPruner, RetentionPolicy
+from .helpers import copy_preserve_tree, filter_paths_by_patterns, get_timestamp
 
-__all__ = ["SyncApp", "copy_preserve_tree", "filter_paths_by_patterns", "compute_files_hash", "get_timestamp"]
+__all__ = ["SyncApp", "DigestCache", "BackupStore", "BackupPruner", "RetentionPolicy", "copy_preserve_tree", "filter_paths_by_patterns", "get_timestamp"]
@@ -0,0 +1,284 @@
+"""
+后台备份清理
+- 在低优先级后台线程中执行，不阻塞启动与配置重载；多次请求合并为一次清理
+- 保留策略：count（保留最新 max_backups 份）或 tiered（最近 hourly_hours 小时每小时一份、
+  最近 daily_days 天每天一份、更早的 weekly_weeks 周内每周一份）
+- 可选总字节预算：超出时从最旧的保留快照开始删除，最新快照始终保留
+- 目录快照先重命名到 .prune 下（立即从快照列表中消失）再整树删除；
+  与其他快照硬链接共享的文件只在最后一个链接被删除时计入回收字节
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import os
+import shutil
+import sys
+import threading
+from log_util import log
+from .backup_store import BackupStore
+from .helpers import SNAPSHOT_NAME
+
+# 快照名前缀为 get_timestamp() 格式
+_STAMP_FORMAT = "%Y%m%d_%H%M%S"
+_TRASH = ".prune"
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    备份保留策略
+    - mode: "count" 或 "tiered"
+    - max_backups: count 模式保留的快照数
+    - hourly_hours / daily_days / weekly_weeks: tiered 模式各层覆盖的时间范围
+    - max_bytes: 总字节预算，0 表示不限制
+    """
+    mode: str = "count"
+    max_backups: int = 20
+    hourly_hours: int = 24
+    daily_days: int = 7
+    weekly_weeks: int = 52
+    max_bytes: int = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "RetentionPolicy":
+        return cls(
+            mode=str(cfg.get("retention", "count")),
+            max_backups=max(1, int(cfg.get("max_backups", 20))),
+            hourly_hours=max(0, int(cfg.get("hourly_hours", 24))),
+            daily_days=max(0, int(cfg.get("daily_days", 7))),
+            weekly_weeks=max(0, int(cfg.get("weekly_weeks", 52))),
+            max_bytes=max(0, int(cfg.get("max_total_mb", 0))) << 20,
+        )
+
+
+def snapshot_time(name: str) -> Optional[datetime]:
+    """
+    从快照名解析创建时间；同一秒内的序号后缀忽略
+    """
+    try:
+        return datetime.strptime(name[:15], _STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def plan_retention(names: List[str], policy: RetentionPolicy, now: datetime) -> Set[str]:
+    """
+    按保留策略选出要保留的快照名；names 按时间从旧到新排序
+    """
+    if not names:
+        return set()
+    if policy.mode != "tiered":
+        return set(names[-policy.max_backups:])
+    keep = {names[-1]}
+    tiers = [
+        (timedelta(hours=policy.hourly_hours), lambda t: (t.year, t.month, t.day, t.hour)),
+        (timedelta(days=policy.daily_days), lambda t: (t.year, t.month, t.day)),
+        (timedelta(weeks=policy.weekly_weeks), lambda t: tuple(t.isocalendar())[:2]),
+    ]
+    seen: Set[Tuple[int, Hashable]] = set()
+    # 从新到旧遍历：每个时间桶保留最新的一份
+    for name in reversed(names):
+        t = snapshot_time(name)
+        if t is None:
+            keep.add(name)
+            continue
+        age = now - t
+        for level, (span, bucket) in enumerate(tiers):
+            if age <= span:
+                key = (level, bucket(t))
+                if key not in seen:
+                    seen.add(key)
+                    keep.add(name)
+                break
+    return keep
+
+
+def trim_to_budget(kept: List[str], blobs: Dict[str, Dict[Hashable, int]], max_bytes: int) -> List[str]:
+    """
+    超出字节预算时从最旧的快照开始丢弃；共享数据块（硬链接或同一对象）只计一次
+    kept 按时间从旧到新排序，返回需要额外丢弃的快照名
+    """
+    refs: Dict[Hashable, int] = {}
+    sizes: Dict[Hashable, int] = {}
+    for name in kept:
+        for blob, size in blobs.get(name, {}).items():
+            refs[blob] = refs.get(blob, 0) + 1
+            sizes[blob] = size
+    total = sum(sizes.values())
+    drop: List[str] = []
+    for name in kept[:-1]:
+        if total <= max_bytes:
+            break
+        drop.append(name)
+        for blob in blobs.get(name, {}):
+            refs[blob] -= 1
+            if refs[blob] == 0:
+                total -= sizes[blob]
+    return drop
+
+
+def _tree_blobs(root: Path) -> Dict[Hashable, int]:
+    """
+    目录快照中的数据块：(st_dev, st_ino) -> size
+    """
+    blobs: Dict[Hashable, int] = {}
+    for d, _, files in os.walk(root):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(d, name))
+            except OSError:
+                continue
+            blobs[(st.st_dev, st.st_ino)] = st.st_size
+    return blobs
+
+
+def _lower_priority():
+    # Linux 下 nice 值按线程生效；其他平台保持默认优先级
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (OSError, AttributeError):
+        pass
+
+
+class BackupPruner:
+    """
+    后台备份清理器
+    - request(backup_dir, store, policy): 请求一次清理（只保留最新的请求）
+    - prune(...): 同步执行清理，返回 (删除的快照数, 回收字节数)
+    - lock: 与备份创建共用的锁，防止回收正在写入的快照引用的数据
+    """
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending: Optional[Tuple[Path, Optional[BackupStore], RetentionPolicy]] = None
+        self._pending_lock = threading.Lock()
+        # 保护 _thread 与停止标志：工作线程只在持锁确认停止后退出并清空引用，
+        # stop() 超时后线程仍在清理时，start() 复用它而不是再创建一个
+        self._state_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._state_lock:
+            self._stop.clear()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="BackupPruner", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        with self._state_lock:
+            self._stop.set()
+            thread = self._thread
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                log("backup_pruner_stop_timeout: timeout_s={t}", t=timeout)
+
+    def request(self, backup_dir: Path, store: Optional[BackupStore], policy: RetentionPolicy):
+        with self._pending_lock:
+            self._pending = (backup_dir, store, policy)
+        self._wake.set()
+
+    def _run(self):
+        _lower_priority()
+        log("backup_pruner_start")
+        while True:
+            self._wake.wait()
+            with self._state_lock:
+                if self._stop.is_set():
+                    self._thread = None
+                    break
+            self._wake.clear()
+            with self._pending_lock:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                continue
+            try:
+                self.prune(*pending)
+            except Exception as e:
+                log("backup_cleanup_error: {path} err={err}", path=str(pending[0]), err=str(e))
+        log("backup_pruner_stop")
+
+    def prune(self, backup_dir: Path, store: Optional[BackupStore], policy: RetentionPolicy) -> Tuple[int, int]:
+        with self._lock:
+            trees = {p.name: p for p in backup_dir.iterdir() if p.is_dir() and SNAPSHOT_NAME.match(p.name)} if backup_dir.is_dir() else {}
+            stored = set(store.snapshots()) if store is not None else set()
+            names = sorted(set(trees) | stored)
+            keep = plan_retention(names, policy, datetime.now())
+            kept = [n for n in names if n in keep]
+            if policy.max_bytes and kept:
+                blobs: Dict[str, Dict[Hashable, int]] = {}
+                object_sizes = store.object_sizes() if stored else {}
+                for name in kept:
+                    entry: Dict[Hashable, int] = {}
+                    if name in trees:
+                        entry.update(_tree_blobs(trees[name]))
+                    if name in stored:
+                        for files in store.load(name).values():
+                            entry.update((v[0], object_sizes.get(v[0], 0)) for v in files.values())
+                    blobs[name] = entry
+                over = trim_to_budget(kept, blobs, policy.max_bytes)
+                if over:
+                    log("backup_cleanup_budget: max_bytes={max} dropped={n}", max=policy.max_bytes, n=len(over))
+                    keep.difference_update(over)
+            drop = [n for n in names if n not in keep]
+            reclaimed = self._reclaim_tree_bytes([trees[n] for n in drop if n in trees])
+            trash = backup_dir / _TRASH
+            doomed: List[Path] = []
+            for name in drop:
+                if name not in trees:
+                    continue
+                try:
+                    trash.mkdir(exist_ok=True)
+                    target = trash / name
+                    os.replace(trees[name], target)
+                    doomed.append(target)
+                except OSError as e:
+                    log("backup_cleanup_error: {path} err={err}", path=str(trees[name]), err=str(e))
+            if store is not None:
+                _, _, store_bytes = store.gc([n for n in drop if n in stored])
+                reclaimed += store_bytes
+        # 已移出快照列表的目录在锁外删除（包括上次中断遗留的目录）
+        if trash.is_dir():
+            for p in list(trash.iterdir()):
+                self._remove_tree(p)
+            try:
+                trash.rmdir()
+            except OSError:
+                pass
+        log("backup_cleanup_done: mode={mode} kept={kept} removed={removed} reclaimed_bytes={bytes}",
+            mode=policy.mode, kept=len(names) - len(drop), removed=len(drop), bytes=reclaimed)
+        return len(drop), reclaimed
+
+    @staticmethod
+    def _reclaim_tree_bytes(roots: Iterable[Path]) -> int:
+        """
+        删除这些目录后实际释放的字节：数据块的全部硬链接都位于待删除目录中才会被释放
+        """
+        counts: Dict[Hashable, List[int]] = {}
+        for root in roots:
+            for d, _, files in os.walk(root):
+                for name in files:
+                    try:
+                        st = os.lstat(os.path.join(d, name))
+                    except OSError:
+                        continue
+                    c = counts.setdefault((st.st_dev, st.st_ino), [0, st.st_nlink, st.st_size])
+                    c[0] += 1
+        return sum(size for seen, nlink, size in counts.values() if seen >= nlink)
+
+    @staticmethod
+    def _remove_tree(path: Path):
+        def _onexc(func, p, exc):
+            log("backup_cleanup_error: {path} err={err}", path=str(p), err=str(exc))
+        if sys.version_info >= (3, 12):
+            shutil.rmtree(path, onexc=_onexc)
+        else:
+            shutil.rmtree(path, onerror=lambda func, p, exc_info: _onexc(func, p, exc_info[1]))
+        log("backup_cleanup_removed: {path}", path=str(path))
@@ -0,0 +1,254 @@
+"""
+内容寻址备份存储
+- objects/<摘要前两位>/<摘要>: 压缩后的文件内容（zlib 或 lzma），同一内容在所有快照与游戏间只保存一次
+- snapshots/<快照名>.json: 快照索引，"<游戏名>/<index>" -> {相对路径: [摘要, size, mtime_ns]}
+- 清理按可达性回收：删除多余快照索引后，删除不再被任何快照引用的对象
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+import hashlib
+import json
+import lzma
+import os
+import zlib
+from log_util import log
+from file_util import staging_path
+from .helpers import relative_posix
+
+if TYPE_CHECKING:
+    from .digest_cache import DigestCache
+
+# 快照索引：游戏键 -> 相对路径 -> [摘要, size, mtime_ns]
+SnapshotIndex = Dict[str, Dict[str, list]]
+
+_CHUNK = 1 << 20
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+COMPRESSIONS = ("zlib", "lzma")
+
+
+def _compressor(name: str):
+    return lzma.LZMACompressor(preset=6) if name == "lzma" else zlib.compressobj(6)
+
+
+def _decompressor(head: bytes):
+    # 按魔数识别，存储中可以混合两种压缩格式
+    return lzma.LZMADecompressor() if head.startswith(_XZ_MAGIC) else zlib.decompressobj()
+
+
+class BackupStore:
+    """
+    备份存储
+    - create(name, games): 写入一个快照；与最新快照完全一致时跳过并返回 None
+    - restore(name, targets): 把快照中的游戏目录解压到目标目录
+    - gc(drop): 删除指定快照，并回收不可达对象
+    """
+    def __init__(self, root: str | Path, compression: str = "zlib", digests: Optional["DigestCache"] = None):
+        self.root = Path(root)
+        self.compression = compression if compression in COMPRESSIONS else "zlib"
+        self._digests = digests
+        self._objects = self.root / "objects"
+        self._snapshots = self.root / "snapshots"
+
+    def _object_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / digest
+
+    def snapshots(self) -> List[str]:
+        """
+        快照名列表，按时间从旧到新排序
+        """
+        if not self._snapshots.is_dir():
+            return []
+        return sorted(p.stem for p in self._snapshots.glob("*.json"))
+
+    def load(self, name: str) -> SnapshotIndex:
+        with open(self._snapshots / f"{name}.json", "r", encoding="utf-8") as f:
+            return json.load(f)["games"]
+
+    def create(self, name: str, games: Iterable[Tuple[str, Path, List[Path]]]) -> Optional[str]:
+        """
+        创建快照；games 为 (游戏键, 游戏根目录, 文件列表)
+        返回快照名；内容与最新快照一致时返回 None
+        """
+        index: SnapshotIndex = {}
+        stored = 0
+        stored_bytes = 0
+        for key, root, files in games:
+            entries: Dict[str, list] = {}
+            for fp, rel in relative_posix(root, files):
+                try:
+                    st = os.stat(fp)
+                    digest, written = self._put(fp)
+                except OSError as e:
+                    log("backup_store_error: {path} err={err}", path=str(fp), err=str(e))
+                    continue
+                entries[rel] = [digest, st.st_size, st.st_mtime_ns]
+                if written:
+                    stored += 1
+                    stored_bytes += written
+            index[key] = entries
+        if self._digests is not None:
+            self._digests.flush()
+        names = self.snapshots()
+        if names and self._same_content(self.load(names[-1]), index):
+            log("backup_store_skip_unchanged: prev={prev}", prev=names[-1])
+            return None
+        self._snapshots.mkdir(parents=True, exist_ok=True)
+        path = self._snapshots / f"{name}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"games": index}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        log("backup_store_snapshot: name={name} games={g} files={n} new_objects={o} compressed_bytes={b}",
+            name=name, g=len(index), n=sum(len(v) for v in index.values()), o=stored, b=stored_bytes)
+        return name
+
+    @staticmethod
+    def _same_content(a: SnapshotIndex, b: SnapshotIndex) -> bool:
+        if a.keys() != b.keys():
+            return False
+        return all({rel: v[0] for rel, v in a[k].items()} == {rel: v[0] for rel, v in b[k].items()} for k in a)
+
+    def _put(self, fp: Path) -> Tuple[str, int]:
+        """
+        保存文件内容，返回 (摘要, 新写入的压缩字节数)；对象已存在时不重复写入
+        """
+        if self._digests is not None:
+            digest = self._digests.digest(fp)
+            if digest is not None and self._object_path(digest).exists():
+                return digest, 0
+        # 边读边算摘要边压缩，写入临时文件后按实际摘要落位（读取期间文件被改写也不会错配）
+        self._objects.mkdir(parents=True, exist_ok=True)
+        tmp = self._objects / f".tmp-{os.getpid()}-{id(fp)}"
+        h = hashlib.blake2b(digest_size=16)
+        comp = _compressor(self.compression)
+        written = 0
+        try:
+            with open(fp, "rb") as src, open(tmp, "wb") as dst:
+                while True:
+                    chunk = src.read(_CHUNK)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    out = comp.compress(chunk)
+                    if out:
+                        dst.write(out)
+                        written += len(out)
+                out = comp.flush()
+                dst.write(out)
+                written += len(out)
+            digest = h.hexdigest()
+            obj = self._object_path(digest)
+            if obj.exists():
+                tmp.unlink()
+                return digest, 0
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, obj)
+            return digest, written
+        except BaseException:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            raise
+
+    def restore(self, name: str, targets: Dict[str, Path], games: Optional[Iterable[str]] = None) -> int:
+        """
+        将快照解压到目标目录；targets 为 游戏键 -> 目标根目录，games 可限定游戏键或游戏名
+        返回恢复的文件数
+        """
+        index = self.load(name)
+        wanted = set(games) if games else None
+        restored = 0
+        for key, entries in index.items():
+            if wanted is not None and key not in wanted and key.split("/", 1)[0] not in wanted:
+                continue
+            root = targets.get(key)
+            if root is None:
+                log("backup_restore_skip_no_target: game={game}", game=key)
+                continue
+            for rel, (digest, _, mtime_ns) in entries.items():
+                target = root / rel
+                try:
+                    self._extract(digest, target)
+                    os.utime(target, ns=(mtime_ns, mtime_ns))
+                    restored += 1
+                except (OSError, ValueError, lzma.LZMAError, zlib.error) as e:
+                    log("backup_restore_error: {path} err={err}", path=str(target), err=str(e))
+            log("backup_restore_game_done: game={game} target={target} count={count}", game=key, target=str(root), count=len(entries))
+        return restored
+
+    def _extract(self, digest: str, target: Path):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = staging_path(target)
+        with open(self._object_path(digest), "rb") as src, open(tmp, "wb") as dst:
+            head = src.read(_CHUNK)
+            dec = _decompressor(head)
+            while head:
+                dst.write(dec.decompress(head))
+                head = src.read(_CHUNK)
+            # zlib 解压对象需要 flush，lzma 解压对象没有 flush
+            if hasattr(dec, "flush"):
+                dst.write(dec.flush())
+        os.replace(tmp, target)
+
+    def object_sizes(self) -> Dict[str, int]:
+        """
+        摘要 -> 对象压缩后的字节数
+        """
+        sizes: Dict[str, int] = {}
+        if not self._objects.is_dir():
+            return sizes
+        for sub in self._objects.iterdir():
+            if not sub.is_dir():
+                continue
+            for obj in sub.iterdir():
+                try:
+                    sizes[obj.name] = obj.stat().st_size
+                except OSError:
+                    continue
+        return sizes
+
+    def gc(self, drop: Iterable[str]) -> Tuple[int, int, int]:
+        """
+        删除指定快照并回收不可达对象；返回 (删除的快照数, 删除的对象数, 回收字节数)
+        """
+        names = self.snapshots()
+        existing = set(names)
+        drop = [name for name in drop if name in existing]
+        for name in drop:
+            try:
+                (self._snapshots / f"{name}.json").unlink()
+            except OSError as e:
+                log("backup_store_gc_error: {path} err={err}", path=name, err=str(e))
+        reachable = set()
+        for name in self.snapshots():
+            try:
+                for entries in self.load(name).values():
+                    reachable.update(v[0] for v in entries.values())
+            except (OSError, ValueError, KeyError) as e:
+                # 索引损坏时不回收任何对象，避免误删
+                log("backup_store_gc_abort: snapshot={name} err={err}", name=name, err=str(e))
+                return len(drop), 0, 0
+        removed = 0
+        reclaimed = 0
+        if self._objects.is_dir():
+            for sub in self._objects.iterdir():
+                if not sub.is_dir():
+                    # 中断写入遗留的临时文件
+                    if sub.name.startswith(".tmp-"):
+                        sub.unlink(missing_ok=True)
+                    continue
+                for obj in sub.iterdir():
+                    if obj.name in reachable:
+                        continue
+                    try:
+                        size = obj.stat().st_size
+                        obj.unlink()
+                        removed += 1
+                        reclaimed += size
+                    except OSError as e:
+                        log("backup_store_gc_error: {path} err={err}", path=str(obj), err=str(e))
+        log("backup_store_gc_done: snapshots_removed={s} objects_removed={o} reclaimed_bytes={b} kept={k}",
+            s=len(drop), o=removed, b=reclaimed, k=len(names) - len(drop))
+        return len(drop), removed, reclaimed
@@ -0,0 +1,147 @@
+"""
+持久化内容摘要缓存
+- 以 (路径, size, mtime_ns, inode) 为键缓存文件内容的 BLAKE2 摘要，保存在 SQLite 中，重启后仍然有效
+- stat 元组未变化的文件直接复用缓存摘要，只有变化的文件才重新读取内容
+- mtime 距当前过近的文件摘要不落盘（同一时间片内的同尺寸改写无法从 stat 上区分）
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from log_util import log
+
+# 文件 mtime 距当前不足该时长时视为“不可信”，摘要只在内存中使用
+_RACY_WINDOW_NS = 2_000_000_000
+_CHUNK = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """
+    流式计算文件内容的 BLAKE2b 摘要（128 位）
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DigestCache:
+    """
+    内容摘要缓存
+    - digest(path): 返回文件内容摘要；文件不存在或无法读取时返回 None
+    - flush(): 将新计算的摘要批量写入数据库（digests() 结束时自动调用）
+    - 线程安全：内部以锁保护内存表与数据库连接
+    """
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        # 路径 -> (size, mtime_ns, inode, digest)
+        self._mem: Dict[str, Tuple[int, int, int, str]] = {}
+        self._dirty: Dict[str, Optional[Tuple[int, int, int, str]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT)"
+            )
+            self._conn.commit()
+            for path, size, mtime_ns, inode, digest in self._conn.execute("SELECT path, size, mtime_ns, inode, digest FROM digests"):
+                self._mem[path] = (size, mtime_ns, inode, digest)
+            log("digest_cache_open: path={path} entries={n}", path=str(self.db_path), n=len(self._mem))
+        except sqlite3.Error as e:
+            # 数据库不可用时退化为仅内存缓存
+            log("digest_cache_open_error: path={path} err={err}", path=str(self.db_path), err=str(e))
+            self._conn = None
+
+    def digest(self, path: str | Path) -> Optional[str]:
+        """
+        返回文件内容摘要；stat 元组与缓存一致时不读取文件
+        """
+        key = path.as_posix() if isinstance(path, Path) else path
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            with self._lock:
+                if self._mem.pop(key, None) is not None:
+                    self._dirty[key] = None
+            return None
+        except OSError as e:
+            log("digest_stat_error: {path} err={err}", path=key, err=str(e))
+            return None
+        with self._lock:
+            cached = self._mem.get(key)
+        if cached is not None and cached[:3] == (st.st_size, st.st_mtime_ns, st.st_ino):
+            self.hits += 1
+            return cached[3]
+        try:
+            digest = file_digest(key)
+        except OSError as e:
+            log("digest_read_error: {path} err={err}", path=key, err=str(e))
+            return None
+        self.misses += 1
+        entry = (st.st_size, st.st_mtime_ns, st.st_ino, digest)
+        with self._lock:
+            if time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS:
+                # 不可信的 stat：不缓存，下次仍重新读取
+                if self._mem.pop(key, None) is not None:
+                    self._dirty[key] = None
+            else:
+                self._mem[key] = entry
+                self._dirty[key] = entry
+        return digest
+
+    def digests(self, paths: Iterable[str | Path]) -> Dict[str, Optional[str]]:
+        """
+        批量取摘要并写回数据库
+        """
+        result = {}
+        for p in paths:
+            key = p.as_posix() if isinstance(p, Path) else p
+            result[key] = self.digest(key)
+        self.flush()
+        return result
+
+    def flush(self):
+        """
+        将变化的条目写入数据库
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty = self._dirty
+            self._dirty = {}
+            if self._conn is None:
+                return
+            upserts: List[Tuple[str, int, int, int, str]] = []
+            deletes: List[Tuple[str]] = []
+            for key, entry in dirty.items():
+                if entry is None:
+                    deletes.append((key,))
+                else:
+                    upserts.append((key,) + entry)
+            try:
+                if upserts:
+                    self._conn.executemany("INSERT OR REPLACE INTO digests (path, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?)", upserts)
+                if deletes:
+                    self._conn.executemany("DELETE FROM digests WHERE path = ?", deletes)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                log("digest_cache_write_error: err={err}", err=str(e))
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -3,12 +3,19 @@
 """
 from __future__ import annotations
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 from datetime import datetime
-import fnmatch
-import hashlib
-import shutil
+import os
+import re
 from log_util import log
+from file_util import CopyResult, PathFilter, CopyEngine, default_engine
+
+if TYPE_CHECKING:
+    from .digest_cache import DigestCache
+
+
+# 备份快照名：get_timestamp()，同一秒内重复时追加序号
+SNAPSHOT_NAME = re.compile(r"^\d{8}_\d{6}(_\d+)?$")
 
 
 def get_timestamp() -> str:
@@ -16,50 +23,171 @@ def get_timestamp() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-def copy_preserve_tree(files: List[Path], src_root: Path, dst_root: Path):
+def _same_file(src: Path, dst: Path, src_st: os.stat_result, digests: Optional["DigestCache"]) -> bool:
+    """
+    目标是否已与源一致：size 与 mtime_ns 相同即视为一致；size 相同但 mtime 不同时用内容摘要确认
+    """
+    try:
+        dst_st = os.stat(dst)
+    except OSError:
+        return False
+    if dst_st.st_size != src_st.st_size:
+        return False
+    if dst_st.st_mtime_ns == src_st.st_mtime_ns:
+        return True
+    if digests is None:
+        return False
+    src_digest = digests.digest(src)
+    if src_digest is None or src_digest != digests.digest(dst):
+        return False
+    # 内容一致：对齐 mtime，下次直接按 stat 判断
+    try:
+        os.utime(dst, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    except OSError:
+        pass
+    return True
+
+
+def copy_preserve_tree(files: List[Path], src_root: Path, dst_root: Path, digests: Optional["DigestCache"] = None, engine: Optional[CopyEngine] = None, atomic: bool = False) -> CopyResult:
     """
     复制文件到目标根目录，保留相对目录结构，覆盖同名
+    - 目标已与源一致（size/mtime 相同，或提供 digests 时内容相同）的文件跳过
+    - engine: 复制引擎（默认使用进程内共享引擎）
+    - atomic: 经同目录临时文件整批 fsync 后原子替换（用于覆盖正在使用的本地存档）
+    返回 CopyResult，调用方据此判断是否需要提交
     """
-    for fp in files:
-        rel = fp.resolve().relative_to(src_root.resolve())
+    result = CopyResult()
+    pairs = []
+    for fp, rel in relative_posix(src_root, files):
         target = dst_root / rel
-        target.parent.mkdir(parents=True, exist_ok=True)
         try:
-            shutil.copy2(fp.as_posix(), target.as_posix())
+            st = os.stat(fp)
+            if _same_file(fp, target, st, digests):
+                result.skipped += 1
+                continue
+            pairs.append((fp, target))
         except Exception as e:
+            result.failed += 1
             log("copy_preserve_error: {src} -> {dst} err={err}", src=str(fp), dst=str(target), err=str(e))
+    if digests is not None:
+        digests.flush()
+    if pairs:
+        engine = engine or default_engine()
+        result.merge(engine.copy_atomic(pairs) if atomic else engine.copy(pairs))
+    return result
 
 
-def filter_paths_by_patterns(root: Path, files: List[Path], allow: List[str], deny: List[str]) -> List[Path]:
+def link_or_copy_tree(files: List[Path], src_root: Path, dst_root: Path, link_root: Optional[Path], engine: Optional[CopyEngine] = None) -> CopyResult:
     """
-    使用 allow/deny 模式过滤文件列表；模式按相对路径匹配
-    """
-    rels = [(f, f.resolve().relative_to(root.resolve()).as_posix()) for f in files]
-    if allow:
-        allowed = [f for f, rel in rels if any(fnmatch.fnmatch(rel, pat) for pat in allow)]
-    else:
-        allowed = [f for f, _ in rels]
-    if deny:
-        result = [f for f in allowed if not any(fnmatch.fnmatch(f.resolve().relative_to(root.resolve()).as_posix(), pat) for pat in deny)]
-    else:
-        result = allowed
+    增量快照（类似 rsync --link-dest）：link_root 中 size/mtime 与源一致的文件硬链接到目标，其余文件复制
+    - link_root 为 None 或硬链接失败（跨设备、文件系统不支持等）时退回复制
+    """
+    result = CopyResult()
+    pairs = []
+    for fp, rel in relative_posix(src_root, files):
+        target = dst_root / rel
+        try:
+            st = os.stat(fp)
+            if link_root is not None and _same_file(fp, link_root / rel, st, None):
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(link_root / rel, target)
+                    result.linked += 1
+                    continue
+                except OSError as e:
+                    log("backup_link_fallback: {path} err={err}", path=str(target), err=str(e))
+            pairs.append((fp, target))
+        except Exception as e:
+            result.failed += 1
+            log("copy_preserve_error: {src} -> {dst} err={err}", src=str(fp), dst=str(target), err=str(e))
+    if pairs:
+        result.merge((engine or default_engine()).copy(pairs))
     return result
 
 
-def compute_files_hash(files: List[Path]) -> str:
+def tree_matches(files: List[Path], src_root: Path, other_root: Path) -> bool:
     """
-    计算文件列表的哈希值（基于文件路径、大小和修改时间）
-    用于快速判断存档文件是否发生变化
+    other_root 下的文件集合与 files 是否完全一致（相对路径、size 与 mtime_ns 均相同）
     """
-    if not files:
-        return ""
-    hasher = hashlib.sha256()
-    for fp in sorted(files, key=lambda p: p.as_posix()):
+    if not other_root.is_dir():
+        return not files
+    expected = set()
+    for fp, rel in relative_posix(src_root, files):
         try:
-            stat = fp.stat()
-            # 使用文件路径、大小和修改时间作为标识
-            info = f"{fp.as_posix()}:{stat.st_size}:{stat.st_mtime}".encode('utf-8')
-            hasher.update(info)
-        except Exception as e:
-            log("compute_hash_error: {path} err={err}", path=str(fp), err=str(e))
-    return hasher.hexdigest()
+            if not _same_file(fp, other_root / rel, os.stat(fp), None):
+                return False
+        except OSError:
+            return False
+        expected.add(rel)
+    actual = {p.relative_to(other_root).as_posix() for p in other_root.rglob("*") if p.is_file()}
+    return actual == expected
+
+
+def remove_files(root: Path, rels: List[str], path_filter: PathFilter) -> List[Path]:
+    """
+    删除 root 下给定相对路径的文件，只删除通过 allow/deny 过滤的文件；返回实际删除的路径
+    """
+    removed: List[Path] = []
+    for rel in rels:
+        if not path_filter.match(rel):
+            continue
+        target = root / rel
+        try:
+            target.unlink()
+            removed.append(target)
+            log("mirror_remove: {path}", path=str(target))
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            log("mirror_remove_error: {path} err={err}", path=str(target), err=str(e))
+    return removed
+
+
+def stat_relative(root: Path, rels: List[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    stat root 下的相对路径，返回 相对路径 -> (mtime_ns, size)；不存在的文件忽略
+    """
+    entries: Dict[str, Tuple[int, int]] = {}
+    for rel in rels:
+        try:
+            st = os.stat(root / rel)
+        except OSError:
+            continue
+        entries[rel] = (st.st_mtime_ns, st.st_size)
+    return entries
+
+
+def relative_posix(root: Path, files: List[Path]) -> List[Tuple[Path, str]]:
+    """
+    计算文件相对 root 的 posix 路径；位于 root 下的路径直接截取字符串，不做 resolve
+    """
+    base = root.as_posix().rstrip("/")
+    prefix = base + "/"
+    out = []
+    resolved_base = None
+    for f in files:
+        s = f.as_posix()
+        if s.startswith(prefix):
+            out.append((f, s[len(prefix):]))
+        elif s == base:
+            # 根路径本身是单个文件
+            out.append((f, f.name))
+        else:
+            # 相对路径或经由符号链接的路径：退回 resolve
+            if resolved_base is None:
+                resolved_base = root.resolve()
+            try:
+                out.append((f, f.resolve().relative_to(resolved_base).as_posix()))
+            except ValueError:
+                log("filter_path_outside_root: {path} root={root}", path=str(f), root=str(root))
+    return out
+
+
+def filter_paths_by_patterns(root: Path, files: List[Path], allow: List[str], deny: List[str]) -> List[Path]:
+    """
+    使用 allow/deny 模式过滤文件列表；模式按相对路径匹配（编译后的 PathFilter，模式只编译一次）
+    """
+    flt = PathFilter.of(allow, deny)
+    if flt.is_empty:
+        return list(files)
+    return [f for f, rel in relative_posix(root, files) if flt.match(rel)]
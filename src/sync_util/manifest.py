@@ -0,0 +1,64 @@
+"""
+同步清单
+- 记录某个游戏条目上一次同步完成时的文件集合（相对路径 -> (mtime_ns, size)）
+- 与当前文件集合比较即可得到新增、更新与删除，删除只需处理清单中消失的文件
+- 清单属于本机状态，保存在仓库的 .git 目录下，不参与提交
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Tuple
+import json
+import os
+from log_util import log
+
+ManifestEntry = Tuple[int, int]  # (mtime_ns, size)
+
+
+class SyncManifest:
+    """
+    单个游戏条目的同步清单
+    - load(path): 读取清单；文件不存在或损坏时返回空清单（首次同步不做删除）
+    - missing_from(rels): 清单中有、当前集合中没有的相对路径（即需要传播的删除）
+    - save(): 原子写入（临时文件 + os.replace）
+    """
+    def __init__(self, path: Path, files: Dict[str, ManifestEntry] | None = None):
+        self.path = path
+        self.files: Dict[str, ManifestEntry] = files or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "SyncManifest":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            files = {rel: (int(v[0]), int(v[1])) for rel, v in data.get("files", {}).items()}
+            return cls(path, files)
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError, TypeError, IndexError, AttributeError) as e:
+            log("manifest_load_error: path={path} err={err}", path=str(path), err=str(e))
+            return cls(path)
+
+    def missing_from(self, rels: Iterable[str]) -> List[str]:
+        current = set(rels)
+        return sorted(rel for rel in self.files if rel not in current)
+
+    def replace(self, files: Mapping[str, ManifestEntry]):
+        self.files = dict(files)
+
+    def update(self, files: Mapping[str, ManifestEntry], removed: Iterable[str] = ()):
+        """
+        增量更新：写入 files 中的条目并移除 removed 中的路径
+        """
+        for rel in removed:
+            self.files.pop(rel, None)
+        self.files.update(files)
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"files": {rel: list(se) for rel, se in sorted(self.files.items())}}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log("manifest_save_error: path={path} err={err}", path=str(self.path), err=str(e))
@@ -5,19 +5,25 @@
 """
 from __future__ import annotations
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Set, Tuple
 from datetime import datetime
 import threading
 import time
 
 from log_util import log
-from config_util import get_git, get_backup, get_sync, get_games, get_general, reload_config, get_config_path
+from config_util import GameEntry, get_git, get_backup, get_sync, get_games, get_general, reload_config, get_config_path
 from git_util import create_git, GitRepo
-from file_util import ensure_dir
-from watcher_util import create_watcher, Watcher
+from file_util import ensure_dir, PathFilter, CopyResult, CopyEngine
+from watcher_util import create_watcher, Watcher, FileIndex
 from task_util import create_queue, create_task, enqueue, TaskQueue
-from .helpers import copy_preserve_tree, filter_paths_by_patterns, compute_files_hash, get_timestamp
+from .digest_cache import DigestCache
+from .manifest import SyncManifest, ManifestEntry
+from .backup_store import BackupStore
+from .backup_pruner import BackupPruner, RetentionPolicy
+from .helpers import SNAPSHOT_NAME, copy_preserve_tree, get_timestamp, remove_files, stat_relative, link_or_copy_tree, tree_matches
 
+# 退出时等待未完成推送的上限（秒）
+_STOP_PUSH_TIMEOUT_S = 30.0
 
 class SyncApp:
     """
@@ -31,6 +37,15 @@ class SyncApp:
         self._override_username = override_username
         self._override_branch = override_branch
         self._enable_config_watch = enable_config_watch
+        # 共享文件索引（嵌套的游戏目录每轮只遍历一次，备份/同步/哈希/监控共用）
+        self._index = FileIndex()
+        # 内容摘要缓存（[sync] content_digest 开启时创建）
+        self._digests: DigestCache | None = None
+        # 复制引擎（备份、同步、应用共用）
+        self._copier: CopyEngine | None = None
+        # 备份创建与后台清理互斥（清理不会回收正在写入的快照引用的数据）
+        self._backup_lock = threading.Lock()
+        self._pruner = BackupPruner(self._backup_lock)
         
         # 加载配置
         self._load_config()
@@ -45,12 +60,29 @@ class SyncApp:
         self._config_watcher: Watcher | None = None
         # 定时器线程
         self._timer_thread: threading.Thread | None = None
+        # 仓库维护线程（历史压缩与 gc）
+        self._maintenance_thread: threading.Thread | None = None
         self._stop_event = threading.Event()
         # 重启锁（防止配置文件多次变更导致多次重启）
         self._restart_lock = threading.Lock()
         self._restarting = False
-        # 存档文件哈希值缓存（用于判断是否真正变化）
-        self._save_files_hash: Dict[str, str] = {}
+        # 仓库工作区是否可能有未提交的写入（启动时未知，首次同步总是提交）
+        self._repo_dirty = True
+        # 推送任务的输入：是否需要全量同步（add -A），以及监控器报告、尚未复制到仓库的游戏侧路径（绝对路径）
+        # 复制、提交与推送都在推送任务中进行，仓库工作区只由队列线程写入
+        self._stage_lock = threading.Lock()
+        # 拉取应用与复制推送互斥（分属两个队列线程，共用仓库工作区）
+        self._sync_lock = threading.Lock()
+        self._full_sync_pending = False
+        self._pending_sources: Set[str] = set()
+        # 合并进下一次推送的监控器请求数，以及累计节省的提交/推送次数
+        self._push_requests = 0
+        self._commits_saved = 0
+        self._pushes_saved = 0
+        # 镜像模式下同步清单的读写锁（推送、应用与监控线程共用）
+        self._mirror_lock = threading.Lock()
+        # 推送方向已更新、尚未被远端接受的清单（推送成功后落盘，失败时丢弃）
+        self._manifest_pending: Dict[Tuple[str, str], SyncManifest] = {}
         log("app_init_done")
     
     def _load_config(self):
@@ -68,14 +100,41 @@ class SyncApp:
         self.sync_cfg = get_sync()
         self.general = get_general()
         self.games = get_games()
+        # 同一目录可能被多个游戏条目使用：任一条目的 allow/deny 通过即进入索引
+        filters: Dict[str, List[PathFilter]] = {}
+        for g in self.games:
+            filters.setdefault(Path(g.path).resolve().as_posix(), []).append(PathFilter.of(g.allow, g.deny))
+        self._index.set_roots(list(filters), filters=filters)
         self.repo_dir = ensure_dir(self.git_cfg.get("repository_dir", "./repository"))
         self.backup_dir = ensure_dir(self.backup_cfg.get("backup_dir", "./backup"))
+        self._mirror_mode = bool(self.sync_cfg.get("mirror_mode", False))
+        old_copier, self._copier = self._copier, CopyEngine(
+            workers=int(self.sync_cfg.get("copy_workers", 4)),
+            large_bytes=int(self.sync_cfg.get("copy_large_mb", 8)) << 20,
+        )
+        if old_copier is not None:
+            # 进行中的拉取/推送任务可能仍在使用旧引擎：等它们结束后再关闭（之后的任务取到新引擎）
+            with self._sync_lock:
+                old_copier.shutdown()
+        # 内容摘要缓存放在备份目录下（不进入 git 仓库，清理备份时只删除时间戳目录）
+        if self._digests is not None:
+            self._digests.close()
+            self._digests = None
+        if self.sync_cfg.get("content_digest", True):
+            self._digests = DigestCache(self.backup_dir / ".digest_cache.sqlite3")
+        # 备份格式：tree（目录快照，默认）/ store（内容寻址压缩存储，位于 backup_dir/store）
+        self._store: BackupStore | None = None
+        if str(self.backup_cfg.get("format", "tree")) == "store":
+            self._store = BackupStore(self.backup_dir / "store", compression=str(self.backup_cfg.get("compression", "zlib")), digests=self._digests)
+        # 启动与重载配置后的首次应用为全量（本地可能与仓库不一致），之后只应用拉取带来的差异
+        self._full_apply_pending = True
         self.git: GitRepo = create_git(
             remote=self.git_cfg.get("remote", ""),
             repo_dir=str(self.repo_dir),
             branch=self.git_cfg.get("branch", "main"),
             token=self.git_cfg.get("token", ""),
             username=self.git_cfg.get("username", ""),
+            backend=str(self.git_cfg.get("backend", "subprocess")),
         )
 
     def start(self):
@@ -89,6 +148,7 @@ class SyncApp:
         self._enqueue_sync_local_to_repo_and_push()
         self._cleanup_backups()
         self._start_timer()
+        self._start_maintenance()
         self._start_watcher()
         if self._enable_config_watch:
             self._start_config_watcher()
@@ -96,124 +156,509 @@ class SyncApp:
 
     def stop(self):
         """
-        停止定时器与监控器
+        停止定时器与监控器，等待未完成的推送
         """
         log("app_stop")
         self._stop_event.set()
-        if self._timer_thread:
-            self._timer_thread.join(timeout=2)
         if self.watcher:
             self.watcher.release()
         if self._config_watcher:
             self._config_watcher.release()
+        # 不再产生新的推送后，合并窗口中的推送立即执行并等待完成（有上限，避免远端无响应时无法退出）
+        self.q_push.flush()
+        if not self.q_push.join(timeout=_STOP_PUSH_TIMEOUT_S):
+            log("app_stop_push_timeout: timeout_s={t}", t=_STOP_PUSH_TIMEOUT_S)
+        if self._timer_thread:
+            self._timer_thread.join(timeout=2)
+        self._pruner.stop()
+        if self._digests is not None:
+            self._digests.flush()
         log("app_stopped")
 
     def _ensure_repository(self):
         """
         确保仓库存在并在正确分支
         """
-        ok = self.git.ensure_cloned()
+        with self.git.cycle("ensure_repo"):
+            ok = self.git.ensure_cloned()
         log("repo_ready: ok={ok}", ok=ok)
 
+    def _game_files(self, g: GameEntry) -> List[Path]:
+        """
+        从共享文件索引取出游戏目录下按 allow/deny 过滤后的文件
+        - 直接用索引中的路径字符串截取相对路径匹配，不再逐个 resolve
+        """
+        game_root = Path(g.path).resolve()
+        snap = self._index.snapshot(game_root)
+        flt = PathFilter.of(g.allow, g.deny)
+        if flt.is_empty:
+            return [Path(p) for p in snap]
+        prefix = game_root.as_posix() + "/"
+        n = len(prefix)
+        return [Path(p) for p in snap if flt.match(p[n:] if p.startswith(prefix) else p.rpartition("/")[2])]
+
+    def _backup_snapshots(self) -> List[Path]:
+        """
+        backup_dir 下的时间戳快照目录，按时间从旧到新排序
+        """
+        return sorted(p for p in self.backup_dir.iterdir() if p.is_dir() and SNAPSHOT_NAME.match(p.name))
+
+    def _new_snapshot_name(self, existing) -> str:
+        """
+        新快照名（时间戳；同一秒内已存在时追加序号）
+        """
+        taken = set(existing)
+        base = get_timestamp()
+        name, n = base, 1
+        while name in taken:
+            name = f"{base}_{n}"
+            n += 1
+        return name
+
+    def list_backups(self) -> List[str]:
+        """
+        全部备份快照名（目录快照与内容寻址存储中的快照），按时间从旧到新排序
+        """
+        names = [p.name for p in self._backup_snapshots()]
+        store = self._store or BackupStore(self.backup_dir / "store")
+        names.extend(store.snapshots())
+        return sorted(set(names))
+
+    def restore_backup(self, snapshot: str | None = None, games: List[str] | None = None, to: str | Path | None = None) -> int:
+        """
+        从备份快照恢复存档
+        - snapshot: 快照名，默认最新
+        - games: 只恢复指定的游戏名或 "游戏名/index"
+        - to: 恢复到该目录下的 <游戏名>/<index>/；默认恢复到配置中的游戏目录
+        返回恢复的文件数
+        """
+        names = self.list_backups()
+        if not names:
+            log("backup_restore_none")
+            return 0
+        name = snapshot or names[-1]
+        targets: Dict[str, Path] = {}
+        for g in self.games:
+            key = f"{g.name}/{g.index}"
+            targets[key] = Path(to) / g.name / g.index if to else Path(g.path).resolve()
+        store = self._store or BackupStore(self.backup_dir / "store")
+        if name in store.snapshots():
+            if to:
+                # 恢复到指定目录时，快照中已不在配置里的游戏也一并恢复
+                for key in store.load(name):
+                    targets.setdefault(key, Path(to) / key)
+            count = store.restore(name, targets, games)
+        elif (self.backup_dir / name).is_dir() and SNAPSHOT_NAME.match(name):
+            count = 0
+            wanted = set(games) if games else None
+            for key, target in targets.items():
+                if wanted is not None and key not in wanted and key.split("/", 1)[0] not in wanted:
+                    continue
+                src_root = self.backup_dir / name / key
+                if not src_root.is_dir():
+                    continue
+                files = [p for p in src_root.rglob("*") if p.is_file()]
+                result = copy_preserve_tree(files, src_root, ensure_dir(target), engine=self._copier, atomic=True)
+                count += result.copied + result.skipped
+                log("backup_restore_game_done: game={game} target={target} count={count}", game=key, target=str(target), count=len(files))
+        else:
+            log("backup_restore_missing: {name}", name=name)
+            return 0
+        log("backup_restore_done: snapshot={name} files={count}", name=name, count=count)
+        return count
+
     def _backup_local_saves(self):
         """
         将本地存档备份到 backup/[timestamp]/[游戏名]/[index]/
+        - 增量模式：与上一份快照一致的文件硬链接，只复制变化的文件；全部一致时不创建新快照
         """
-        ts_dir = ensure_dir(self.backup_dir / get_timestamp())
+        self._index.ensure_fresh()
+        plan = []
         for g in self.games:
             game_root = Path(g.path).resolve()
             if not game_root.exists():
                 log("backup_skip_missing_root: {path}", path=str(game_root))
                 continue
-            files = list(game_root.rglob("*"))
-            files = [f for f in files if f.is_file()]
-            files = filter_paths_by_patterns(game_root, files, g.allow, g.deny)
+            plan.append((g, game_root, self._game_files(g)))
+        with self._backup_lock:
+            self._write_backup(plan)
+
+    def _write_backup(self, plan: List[Tuple[GameEntry, Path, List[Path]]]):
+        """
+        写入一份备份快照（调用方持有 _backup_lock）
+        """
+        if self._store is not None:
+            self._store.create(self._new_snapshot_name(self._store.snapshots()), [(f"{g.name}/{g.index}", root, files) for g, root, files in plan])
+            return
+        snapshots = self._backup_snapshots()
+        prev = snapshots[-1] if snapshots and self.backup_cfg.get("incremental", True) else None
+        if prev is not None and all(tree_matches(files, game_root, prev / g.name / g.index) for g, game_root, files in plan):
+            log("backup_skip_unchanged: prev={dir}", dir=str(prev))
+            return
+        ts_dir = ensure_dir(self.backup_dir / self._new_snapshot_name(p.name for p in snapshots))
+        for g, game_root, files in plan:
             dst_root = ensure_dir(ts_dir / g.name / g.index)
-            copy_preserve_tree(files, game_root, dst_root)
-            log("backup_game_done: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(files))
+            link_root = prev / g.name / g.index if prev is not None else None
+            result = link_or_copy_tree(files, game_root, dst_root, link_root, engine=self._copier)
+            log("backup_game_done: game={name} index={index} copied={count} linked={linked} bytes={bytes}",
+                name=g.name, index=g.index, count=result.copied, linked=result.linked, bytes=result.bytes_written)
         log("backup_done: ts_dir={dir}", dir=str(ts_dir))
 
-    def _apply_repo_to_local(self):
+    def _manifest(self, g: GameEntry) -> SyncManifest | None:
+        """
+        读取游戏条目的同步清单（保存在仓库 .git 目录下）；仓库尚未初始化时返回 None
+        """
+        git_dir = self.repo_dir / ".git"
+        if not git_dir.is_dir():
+            return None
+        return SyncManifest.load(git_dir / "game_save_sync" / "manifests" / g.name / f"{g.index}.json")
+
+    def _push_manifest(self, g: GameEntry) -> SyncManifest | None:
         """
-        将 repository 下的存档覆盖到本地（强制覆盖）
+        推送方向使用的清单（调用方持有 _mirror_lock）：本轮已更新但尚未推送的清单优先，
+        更新只保存在内存中，远端接受推送后才由 _settle_manifests 落盘
         """
-        import shutil
+        key = (g.name, g.index)
+        manifest = self._manifest_pending.get(key)
+        if manifest is None:
+            manifest = self._manifest(g)
+            if manifest is not None:
+                self._manifest_pending[key] = manifest
+        return manifest
+
+    def _settle_manifests(self, accepted: bool):
+        """
+        推送结束：远端已接受时保存推送方向的清单更新，否则丢弃
+        - 清单只前进到远端已有的状态；未推送成功的复制不会让之后的应用把本地存档当作远端删除
+        """
+        with self._mirror_lock:
+            pending, self._manifest_pending = self._manifest_pending, {}
+            if accepted:
+                for manifest in pending.values():
+                    manifest.save()
+        if pending:
+            log("manifest_settle: accepted={accepted} games={n}", accepted=accepted, n=len(pending))
+
+    def _apply_repo_to_local(self, changes: List[Tuple[str, str]] | None = None, allow_delete: bool = True):
+        """
+        将 repository 下的存档覆盖到本地（强制覆盖；内容已一致的文件跳过）
+        - changes 为 None 时全量处理；否则为 git diff --name-status 的 (状态, 仓库相对路径)，只处理涉及的游戏与文件
+        - 镜像模式：远端已删除且通过过滤的本地文件一并删除；allow_delete=False 时只复制不删除
+        """
+        by_game: Dict[Tuple[str, str], Tuple[List[str], List[str]]] | None = None
+        if changes is not None:
+            by_game = {}
+            for status, path in changes:
+                parts = path.split("/", 2)
+                if len(parts) < 3:
+                    continue
+                changed, removed = by_game.setdefault((parts[0], parts[1]), ([], []))
+                (removed if status == "D" else changed).append(parts[2])
         for g in self.games:
-            src_root = self.repo_dir / g.name / g.index
-            dst_root = Path(g.path).resolve()
-            if not src_root.exists():
-                log("apply_skip_repo_missing: {path}", path=str(src_root))
+            if by_game is None:
+                self._apply_game(g, allow_delete=allow_delete)
                 continue
-            ensure_dir(dst_root)
-            for p in src_root.rglob("*"):
-                if p.is_file():
-                    rel = p.resolve().relative_to(src_root.resolve())
-                    target = dst_root / rel
-                    target.parent.mkdir(parents=True, exist_ok=True)
-                    try:
-                        shutil.copy2(p.as_posix(), target.as_posix())
-                    except Exception as e:
-                        log("apply_copy_error: {src} -> {dst} err={err}", src=str(p), dst=str(target), err=str(e))
-            log("apply_game_done: game={name} index={index}", name=g.name, index=g.index)
-        log("apply_done")
-
-    def _sync_local_to_repo(self):
-        """
-        将本地新增或变化的存档复制到 repository 下对应目录
+            changed, removed = by_game.get((g.name, g.index), ([], []))
+            if changed or removed:
+                self._apply_game(g, changed, removed)
+        log("apply_done: mode={mode} games={games}", mode="full" if by_game is None else "diff",
+            games=len(self.games) if by_game is None else len(by_game))
+
+    def _apply_game(self, g: GameEntry, changed: List[str] | None = None, removed: List[str] | None = None,
+                    allow_delete: bool = True):
         """
+        覆盖单个游戏条目；changed 为 None 时遍历仓库目录全量处理，否则只复制 changed、删除 removed（相对路径）
+        - allow_delete=False：不删除本地文件，清单仍按仓库内容更新（本地多出的文件视为新文件）
+        """
+        src_root = self.repo_dir / g.name / g.index
+        dst_root = Path(g.path).resolve()
+        if changed is None and not src_root.exists():
+            log("apply_skip_repo_missing: {path}", path=str(src_root))
+            return
+        ensure_dir(dst_root)
+        if changed is None:
+            files = [p for p in src_root.rglob("*") if p.is_file()]
+        else:
+            files = [src_root / rel for rel in changed]
+        with self._mirror_lock:
+            manifest = self._manifest(g) if self._mirror_mode else None
+            removed_paths: List[Path] = []
+            if manifest is not None:
+                flt = PathFilter.of(g.allow, g.deny)
+                if changed is None:
+                    rels = [p.relative_to(src_root).as_posix() for p in files]
+                    gone = manifest.missing_from(rels)
+                    mass = bool(gone) and not rels
+                else:
+                    rels = changed
+                    gone = sorted(removed or ())
+                    mass = bool(gone) and not rels and not set(manifest.files) - set(gone)
+                if mass:
+                    log("mirror_skip_mass_delete: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(gone))
+                    gone = []
+                elif allow_delete:
+                    # 只删除自上次同步以来本地未改动的文件；本地改动过的保留（之后作为本地新文件推送）
+                    local = stat_relative(dst_root, gone)
+                    kept = sorted(rel for rel, se in local.items() if tuple(manifest.files.get(rel, ())) != se)
+                    if kept:
+                        log("mirror_keep_local_modified: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(kept))
+                    removed_paths = remove_files(dst_root, sorted(set(local) - set(kept)), flt)
+            # 本地存档可能正被游戏读取：写入临时文件、整批落盘后原子替换
+            result = copy_preserve_tree(files, src_root, dst_root, digests=self._digests, engine=self._copier, atomic=True)
+            result.record_removed(removed_paths)
+            if manifest is not None:
+                current = stat_relative(dst_root, [rel for rel in rels if flt.match(rel)])
+                if changed is None:
+                    manifest.replace(current)
+                else:
+                    manifest.update(current, gone)
+                manifest.save()
+                # 本地已被远端内容覆盖，推送方向未落盘的清单更新作废
+                self._manifest_pending.pop((g.name, g.index), None)
+        log("apply_game_done: game={name} index={index} copied={copied} skipped={skipped} deleted={deleted} bytes={bytes}",
+            name=g.name, index=g.index, copied=result.copied, skipped=result.skipped, deleted=result.deleted, bytes=result.bytes_written)
+
+    def _sync_game_to_repo(self, g: GameEntry, files: List[Path]) -> CopyResult:
+        """
+        将单个游戏条目的文件复制到仓库
+        - 镜像模式：本地已删除（清单中有、当前没有）且通过过滤的仓库文件一并删除，并更新清单
+        """
+        game_root = Path(g.path).resolve()
+        dst_root = ensure_dir(self.repo_dir / g.name / g.index)
+        with self._mirror_lock:
+            result = copy_preserve_tree(files, game_root, dst_root, digests=self._digests, engine=self._copier)
+            manifest = self._push_manifest(g) if self._mirror_mode else None
+            if manifest is None:
+                return result
+            snap = self._index.snapshot(game_root)
+            current: Dict[str, ManifestEntry] = {}
+            for f in files:
+                rel = f.relative_to(game_root).as_posix()
+                se = snap.get(f.as_posix())
+                current[rel] = se if se is not None else stat_relative(game_root, [rel]).get(rel, (0, 0))
+            gone = manifest.missing_from(current)
+            if gone and not current:
+                # 目录存在但为空（例如存储未挂载）：不把整棵树的删除传播到仓库
+                log("mirror_skip_mass_delete: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(gone))
+                return result
+            result.record_removed(remove_files(dst_root, gone, PathFilter.of(g.allow, g.deny)))
+            manifest.replace(current)
+        return result
+
+    def _games_for_paths(self, paths: Iterable[str]) -> List[Tuple[GameEntry, List[str]]]:
+        """
+        将监控器报告的绝对路径映射到拥有它们的游戏条目（嵌套目录下的文件可属于多个条目）
+        返回 (条目, 通过该条目 allow/deny 过滤的相对路径)
+        """
+        owners = [(Path(g.path).resolve().as_posix() + "/", g, PathFilter.of(g.allow, g.deny)) for g in self.games]
+        owned: Dict[int, List[str]] = {}
+        for p in paths:
+            for i, (prefix, _, flt) in enumerate(owners):
+                if p.startswith(prefix):
+                    rel = p[len(prefix):]
+                    if flt.match(rel):
+                        owned.setdefault(i, []).append(rel)
+        return [(owners[i][1], sorted(rels)) for i, rels in owned.items()]
+
+    def _repo_paths(self, result: CopyResult) -> List[str]:
+        """
+        复制结果中写入或删除的仓库文件，转换为仓库相对路径（用于提交）
+        """
+        return [p.relative_to(self.repo_dir).as_posix() for p in result.paths + result.removed]
+
+    def _sync_game_paths(self, g: GameEntry, rels: List[str]) -> CopyResult:
+        """
+        只同步游戏条目下给定的相对路径：存在的文件复制到仓库，镜像模式下不存在的文件从仓库删除
+        """
+        game_root = Path(g.path).resolve()
+        dst_root = ensure_dir(self.repo_dir / g.name / g.index)
+        present = [rel for rel in rels if (game_root / rel).is_file()]
+        gone = sorted(set(rels) - set(present))
+        with self._mirror_lock:
+            result = copy_preserve_tree([game_root / rel for rel in present], game_root, dst_root, digests=self._digests, engine=self._copier)
+            manifest = self._push_manifest(g) if self._mirror_mode else None
+            if manifest is None:
+                return result
+            if gone and not present and not set(manifest.files) - set(gone):
+                # 清单中的文件全部消失（例如存储未挂载）：不把整棵树的删除传播到仓库
+                log("mirror_skip_mass_delete: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(gone))
+                return result
+            result.record_removed(remove_files(dst_root, gone, PathFilter.of(g.allow, g.deny)))
+            manifest.update(stat_relative(game_root, present), gone)
+        return result
+
+    def _sync_sources_to_repo(self, sources: Set[str]) -> List[str]:
+        """
+        将监控器报告的游戏侧路径复制到仓库（镜像模式下同步删除），返回写入或删除的仓库相对路径
+        """
+        staged: List[str] = []
+        for g, rels in self._games_for_paths(sources):
+            result = self._sync_game_paths(g, rels)
+            paths = self._repo_paths(result)
+            if paths:
+                staged.extend(paths)
+                log("watch_sync_copy_done: game={name} index={index} paths={paths} copied={copied} skipped={skipped} deleted={deleted} bytes={bytes}",
+                    name=g.name, index=g.index, paths=len(rels), copied=result.copied, skipped=result.skipped, deleted=result.deleted, bytes=result.bytes_written)
+            else:
+                log("watch_skip_no_change: game={name} index={index} paths={paths}", name=g.name, index=g.index, paths=len(rels))
+        return staged
+
+    def _sync_local_to_repo(self) -> CopyResult:
+        """
+        将本地新增或变化的存档复制到 repository 下对应目录；返回合计的复制结果
+        """
+        self._index.ensure_fresh()
+        total = CopyResult()
         for g in self.games:
             game_root = Path(g.path).resolve()
             if not game_root.exists():
                 log("sync_skip_missing_root: {path}", path=str(game_root))
                 continue
-            files = [p for p in game_root.rglob("*") if p.is_file()]
-            files = filter_paths_by_patterns(game_root, files, g.allow, g.deny)
-            dst_root = ensure_dir(self.repo_dir / g.name / g.index)
-            copy_preserve_tree(files, game_root, dst_root)
-            log("sync_copy_game_done: game={name} index={index} count={count}", name=g.name, index=g.index, count=len(files))
+            files = self._game_files(g)
+            result = self._sync_game_to_repo(g, files)
+            total.merge(result)
+            log("sync_copy_game_done: game={name} index={index} copied={copied} skipped={skipped} deleted={deleted} bytes={bytes}",
+                name=g.name, index=g.index, copied=result.copied, skipped=result.skipped, deleted=result.deleted, bytes=result.bytes_written)
+        return total
 
     def _enqueue_pull_apply(self):
         """
         入队拉取与应用任务（唯一任务）
+        - 与推送任务互斥（_sync_lock）：拉取的 reset/clean 不会清除推送任务尚未提交的复制
+        - 合并窗口中还有监控器报告、尚未推送的本地变化时先执行推送，避免应用远端内容时覆盖它们
         """
         def do_pull_apply():
-            self.git.force_pull()
-            self._apply_repo_to_local()
+            with self._sync_lock:
+                with self._stage_lock:
+                    flush = bool(self._pending_sources) and not self._full_apply_pending
+                    waiting = len(self._pending_sources)
+                if flush:
+                    log("pull_flush_pending_push: paths={n}", n=waiting)
+                    self._sync_push()
+                self._pull_apply()
         t = create_task(do_pull_apply, unique=True, insert_mode='tail', key='pull_apply')
         enqueue(self.q_pull, t)
 
-    def _enqueue_sync_local_to_repo_and_push(self):
+    def _pull_apply(self):
+        """
+        拉取远端并应用到本地（须持有 _sync_lock）
+        """
+        with self.git.cycle("pull_apply"):
+            # 首次全量应用之后先探测远端：分支未移动时跳过 fetch/reset/clean 与应用
+            self.git.force_pull(probe=not self._full_apply_pending)
+            heads = self.git.last_pull
+            changes = None
+            allow_delete = True
+            if not self._full_apply_pending:
+                # 本轮会话已全量应用过：HEAD 未移动（或拉取失败）时仓库内容不变，无需应用
+                if heads is None or heads[0] == heads[1]:
+                    log("apply_skip_head_unchanged: head={head}", head=heads[1][:12] if heads else "")
+                    return
+                old_head, new_head, old_remote = heads
+                if old_head and old_head == old_remote:
+                    # 以上次同步的远端状态为基准；差异获取失败时退回全量应用
+                    changes = self.git.diff_name_status(old_remote, new_head)
+                elif old_head:
+                    # 本地有未推送的提交（已被 reset 丢弃）：其文件在差异中会显示为删除，
+                    # 改为不删除的全量应用，并全量同步把本地仍存在的文件重新推送
+                    allow_delete = False
+                    log("apply_full_local_ahead: head={head} remote={remote}", head=old_head[:12], remote=old_remote[:12])
+            self._apply_repo_to_local(changes, allow_delete=allow_delete)
+            self._full_apply_pending = False
+            if not allow_delete:
+                self._enqueue_sync_local_to_repo_and_push()
+            # 本地存档已被覆盖，未被监控器维护时索引需重新遍历
+            self._index.invalidate()
+
+    def _enqueue_sync_local_to_repo_and_push(self, full: bool = True):
         """
         入队本地复制到仓库并推送（唯一任务）
+        - full=True: 执行时全量同步所有游戏
+        - full=False: 只复制并提交监控器报告的路径；文件内容均未变化时跳过推送（队列中已有全量任务时仍按全量执行）
+        - 提交只涉及写入或删除的仓库路径（commit_paths，不扫描工作区）；工作区状态未知时退回 add -A + commit
+        - 监控器触发的推送按 [sync] push_coalesce_seconds 合并：窗口内的变化顺延到一次提交与推送，
+          最长不超过首次变化后 push_max_latency_seconds；全量同步（启动/重载）立即执行
         """
+        with self._stage_lock:
+            if full:
+                self._full_sync_pending = True
+            else:
+                self._push_requests += 1
+
         def do_sync_push():
-            self._sync_local_to_repo()
-            self.git.add(None)
-            device = self.general.get("device_id", "") or "device"
-            msg = f"sync by {device} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            self.git.commit(msg)
-            self.git.force_push()
-        t = create_task(do_sync_push, unique=True, insert_mode='tail', key='sync_push')
+            with self._sync_lock:
+                self._sync_push()
+        coalesce_s = 0.0 if full else float(self.sync_cfg.get("push_coalesce_seconds", 5))
+        max_latency_s = float(self.sync_cfg.get("push_max_latency_seconds", 30))
+        t = create_task(do_sync_push, unique=True, insert_mode='tail', key='sync_push', coalesce_s=coalesce_s, max_latency_s=max_latency_s)
         enqueue(self.q_push, t)
 
+    def _sync_push(self):
+        """
+        复制本地变化到仓库、提交并推送（须持有 _sync_lock）；取走当前所有推送输入
+        """
+        with self.git.cycle("sync_push"):
+            with self._stage_lock:
+                full_sync = self._full_sync_pending
+                self._full_sync_pending = False
+                sources, self._pending_sources = self._pending_sources, set()
+                requests, self._push_requests = self._push_requests, 0
+            if full_sync:
+                # 全量同步已覆盖监控器报告的路径
+                paths = sorted(self._repo_paths(self._sync_local_to_repo()))
+            else:
+                paths = sorted(self._sync_sources_to_repo(sources))
+            dirty = self._repo_dirty
+            if not (paths or dirty or full_sync):
+                # 监控器报告的文件与仓库内容一致：没有新的提交，不必推送
+                self._settle_manifests(True)
+                log("sync_skip_push_no_change: sources={n}", n=len(sources))
+                return
+            self._repo_dirty = False
+            committed = False
+            if paths or dirty:
+                device = self.general.get("device_id", "") or "device"
+                msg = f"sync by {device} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                if dirty:
+                    self.git.add(None)
+                    committed = self.git.commit(msg)
+                else:
+                    committed = self.git.commit_paths(paths, msg)
+                if committed is None:
+                    # 提交失败：复制结果不在任何提交中，推送旧 HEAD 会让清单记录远端没有的文件。
+                    # 丢弃本轮清单、不推送，下一次全量同步并 add -A 重新提交
+                    self._repo_dirty = True
+                    with self._stage_lock:
+                        self._full_sync_pending = True
+                    self._settle_manifests(False)
+                    log("sync_skip_push_commit_failed: paths={n} dirty={dirty}", n=len(paths), dirty=dirty)
+                    return
+            else:
+                # 没有任何文件写入仓库：跳过 add/commit，仍推送可能尚未推送的提交
+                log("sync_skip_commit_no_copy")
+            pushed = self.git.force_push()
+            # 未配置远端时不会拉取与重置，工作区即同步目标
+            accepted = pushed or not self.git.remote
+            self._settle_manifests(accepted)
+            if not accepted:
+                # 本轮的复制与删除未到达远端：下一次推送全量重新计算
+                with self._stage_lock:
+                    self._full_sync_pending = True
+            if requests > 1:
+                # 不合并时每个监控器请求各自提交并推送一次；与本轮实际执行的次数比较
+                commits_saved = max(0, requests - (1 if committed else 0))
+                pushes_saved = max(0, requests - (1 if self.git.remote else 0))
+                self._commits_saved += commits_saved
+                self._pushes_saved += pushes_saved
+                log("sync_push_coalesced: requests={n} commits_saved={c} pushes_saved={p} total_commits_saved={tc} total_pushes_saved={tp}",
+                    n=requests, c=commits_saved, p=pushes_saved, tc=self._commits_saved, tp=self._pushes_saved)
+
     def _cleanup_backups(self):
         """
-        清理多余备份，保留最近 max_backups
-        """
-        max_b = int(self.backup_cfg.get("max_backups", 20))
-        items = sorted([p for p in self.backup_dir.iterdir() if p.is_dir()], key=lambda p: p.stat().st_mtime, reverse=True)
-        for p in items[max_b:]:
-            try:
-                for f in p.rglob("*"):
-                    if f.is_file():
-                        f.unlink()
-                for d in sorted([d for d in p.rglob("*") if d.is_dir()], reverse=True):
-                    d.rmdir()
-                p.rmdir()
-                log("backup_cleanup_removed: {path}", path=str(p))
-            except Exception as e:
-                log("backup_cleanup_error: {path} err={err}", path=str(p), err=str(e))
-        log("backup_cleanup_done: kept={kept}", kept=min(len(items), max_b))
+        请求后台清理多余备份（[backup] retention / max_backups / max_total_mb），不阻塞调用线程
+        """
+        self._pruner.start()
+        self._pruner.request(self.backup_dir, self._store, RetentionPolicy.from_config(self.backup_cfg))
 
     def _start_timer(self):
         """
@@ -228,68 +673,116 @@ class SyncApp:
         self._timer_thread = threading.Thread(target=_timer_loop, name="SyncTimer", daemon=True)
         self._timer_thread.start()
 
+    def _start_maintenance(self):
+        """
+        仓库维护线程：每 maintenance_interval_hours 小时执行一次（<= 0 关闭），不占用拉取/推送队列
+        """
+        if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+            return
+        def _maintenance_loop():
+            log("maintenance_start")
+            # 每轮重新读取间隔（配置重载后生效）
+            while True:
+                hours = float(self.git_cfg.get("maintenance_interval_hours", 24))
+                if hours <= 0:
+                    log("maintenance_disabled")
+                    break
+                if self._stop_event.wait(hours * 3600):
+                    break
+                try:
+                    self._run_maintenance()
+                except Exception as e:
+                    log("maintenance_error: err={err}", err=str(e))
+            log("maintenance_stop")
+        self._maintenance_thread = threading.Thread(target=_maintenance_loop, name="GitMaintenance", daemon=True)
+        self._maintenance_thread.start()
+
+    def _run_maintenance(self):
+        """
+        按 [git] compact_keep_commits / compact_keep_days 压缩历史并强制推送，然后 gc；记录前后仓库大小
+        - 压缩会改写远端历史：只在远端与本地完全一致（本设备已拉取最新提交且没有未推送的提交）时进行；
+          其他设备须先拉取再推送，否则其推送被拒绝、拉取后以远端为准
+        """
+        git = self.git
+        keep_commits = int(self.git_cfg.get("compact_keep_commits", 0))
+        keep_days = int(self.git_cfg.get("compact_keep_days", 0))
+        with git.cycle("maintenance"):
+            before = git.repo_size()
+            compacted = False
+            if keep_commits > 0 or keep_days > 0:
+                # 与拉取、推送互斥：确认远端一致到强制推送之间不会有新的提交或重置
+                with self._sync_lock:
+                    if git.remote_is_current():
+                        compacted = git.compact_history(keep_commits, keep_days)
+                    else:
+                        log("maintenance_skip_compact: reason=remote_not_current")
+                    if compacted:
+                        git.force_push()
+            git.maintain()
+            after = git.repo_size()
+        log("maintenance_done: compacted={compacted} size_before={before} size_after={after}", compacted=compacted, before=before, after=after)
+
     def _start_watcher(self):
         """
-        监控所有配置的游戏目录；发生变化时检查存档文件是否真正变化，变化才复制到 repository 并推送
+        监控所有配置的游戏目录；记录监控器报告的变化路径，由推送任务复制到 repository，有写入时才推送
         """
         debounce_ms = int(self.sync_cfg.get("debounce_ms", 1500))
-        pending = {"changed": False}
+        settle_ms = int(self.sync_cfg.get("settle_ms", 2000))
+        settle_polls = int(self.sync_cfg.get("settle_polls", 2))
+        # 启用静止检测时监控器只在写入静止后回调，去抖线程收到通知立即处理
+        settled = settle_ms > 0 or settle_polls > 0
+        # 去抖期间累积的变化路径（绝对路径；嵌套目录的同一变化可能由多个根重复报告）
+        pending: Dict[str, Set[str]] = {"paths": set()}
         lock = threading.Lock()
-        # 路径到配置映射
-        path_to_cfg: Dict[str, Tuple[Path, list, list, str, str]] = {}
-        for g in self.games:
-            root = Path(g.path).resolve()
-            path_to_cfg[root.as_posix()] = (root, g.allow, g.deny, g.name, g.index)
-            # 初始化哈希值
-            if root.exists():
-                files = [p for p in root.rglob("*") if p.is_file()]
-                files = filter_paths_by_patterns(root, files, g.allow, g.deny)
-                self._save_files_hash[root.as_posix()] = compute_files_hash(files)
+        wake = threading.Event()
+        self._index.ensure_fresh()
         
         def _cb(root: str, created: list, modified: list, deleted: list):
             with lock:
-                pending["changed"] = True
+                pending["paths"].update(created, modified, deleted)
+            wake.set()
             log("watch_event_cb: root={root} c={c} m={m} d={d}", root=root, c=len(created), m=len(modified), d=len(deleted))
         
-        self.watcher = create_watcher([Path(g.path) for g in self.games], _cb, interval_ms=max(300, debounce_ms))
+        # 轮询间隔：空闲目录从 min 指数退避到 max，发现变化立即回到 min（min 为 0 时沿用 debounce_ms）
+        min_ms = int(self.sync_cfg.get("watch_interval_min_ms", 0)) or max(300, debounce_ms)
+        max_ms = max(min_ms, int(self.sync_cfg.get("watch_interval_max_ms", 30000)))
+        self.watcher = create_watcher(
+            [Path(g.path) for g in self.games],
+            _cb,
+            interval_ms=min_ms,
+            backend=str(self.sync_cfg.get("watcher_backend", "auto")),
+            index=self._index,
+            max_interval_ms=max_ms,
+            backoff=float(self.sync_cfg.get("watch_backoff", 2.0)),
+            workers=int(self.sync_cfg.get("watch_workers", 4)),
+            settle_ms=settle_ms,
+            settle_polls=settle_polls,
+            settle_max_ms=int(self.sync_cfg.get("settle_max_ms", 60000)),
+        )
         self.watcher.start()
         
         def _debounce_loop():
-            log("watch_debounce_start: interval_ms={ms}", ms=debounce_ms)
+            log("watch_debounce_start: interval_ms={ms} settle={settle}", ms=debounce_ms, settle=settled)
             while not self._stop_event.is_set():
-                time.sleep(debounce_ms / 1000.0)
+                if not wake.wait(0.5):
+                    continue
+                if not settled:
+                    # 未启用静止检测：沿用固定去抖，合并一段时间内的事件
+                    time.sleep(debounce_ms / 1000.0)
+                wake.clear()
                 with lock:
-                    changed = pending["changed"]
-                    pending["changed"] = False
-                if changed:
-                    # 检查存档文件是否真正变化
-                    actual_changed = False
-                    for key, (root, allow, deny, name, index) in path_to_cfg.items():
-                        if not root.exists():
-                            continue
-                        files = [p for p in root.rglob("*") if p.is_file()]
-                        files = filter_paths_by_patterns(root, files, allow, deny)
-                        current_hash = compute_files_hash(files)
-                        old_hash = self._save_files_hash.get(key, "")
-                        
-                        if current_hash != old_hash:
-                            actual_changed = True
-                            self._save_files_hash[key] = current_hash
-                            # 复制变更到 repository
-                            dst_root = ensure_dir(self.repo_dir / name / index)
-                            copy_preserve_tree(files, root, dst_root)
-                            log("watch_sync_copy_done: root={root} game={name} index={index} count={count} hash_changed=True", 
-                                root=str(root), name=name, index=index, count=len(files))
-                        else:
-                            log("watch_skip_no_change: root={root} game={name} index={index} hash_unchanged", 
-                                root=str(root), name=name, index=index)
-                    
-                    # 只有真正变化时才推送
-                    if actual_changed:
-                        self._enqueue_sync_local_to_repo_and_push()
-                        log("watch_trigger_push: actual_changed=True")
+                    paths = pending["paths"]
+                    pending["paths"] = set()
+                if paths:
+                    # 只记录属于游戏条目的变化路径；复制到仓库在推送任务中进行
+                    owned = sum(len(rels) for _, rels in self._games_for_paths(paths))
+                    if owned:
+                        with self._stage_lock:
+                            self._pending_sources.update(paths)
+                        self._enqueue_sync_local_to_repo_and_push(full=False)
+                        log("watch_trigger_push: paths={n}", n=owned)
                     else:
-                        log("watch_skip_push: actual_changed=False")
+                        log("watch_skip_push: paths={n}", n=len(paths))
             log("watch_debounce_stop")
         
         threading.Thread(target=_debounce_loop, name="WatchDebounce", daemon=True).start()
@@ -315,7 +808,8 @@ class SyncApp:
             self._config_watcher = create_watcher(
                 paths=[config_path],
                 callback=_config_changed_callback,
-                interval_ms=2000  # 2秒检查一次配置文件
+                interval_ms=2000,  # 2秒检查一次配置文件
+                backend=str(self.sync_cfg.get("watcher_backend", "auto")),
             )
             self._config_watcher.start()
             log("config_watcher_started: path={path}", path=str(config_path))
@@ -349,8 +843,9 @@ class SyncApp:
             self._load_config()
             log("config_reload_done")
             
-            # 3. 清空哈希缓存（因为可能监控的游戏目录变了）
-            self._save_files_hash.clear()
+            # 3. 清空待复制路径（游戏目录可能变了；重启后的全量同步会 add -A）
+            with self._stage_lock:
+                self._pending_sources.clear()
             
             # 4. 重新执行启动流程（不包括配置监控器本身）
             log("app_restart")
@@ -365,6 +860,7 @@ class SyncApp:
                 # 定时器线程会自然结束，启动新的
                 pass
             self._start_timer()
+            self._start_maintenance()
             
             # 6. 重启游戏存档监控器
             self._start_watcher()
@@ -375,3 +871,4 @@ class SyncApp:
         finally:
             with self._restart_lock:
                 self._restarting = False
+
@@ -14,17 +14,20 @@ def create_queue(name: str) -> TaskQueue:
     return TaskQueue(name=name)
 
 
-def create_task(action: Callable[..., Any], *args, unique: bool = False, insert_mode: InsertMode = "tail", key: Optional[str] = None, **kwargs) -> Task:
+def create_task(action: Callable[..., Any], *args, unique: bool = False, insert_mode: InsertMode = "tail", key: Optional[str] = None,
+                coalesce_s: float = 0.0, max_latency_s: float = 0.0, **kwargs) -> Task:
     """
     创建一个任务，并返回
     - unique: 是否唯一
     - insert_mode: 对唯一任务的插入方式（'tail' 或 'fixed'）
     - key: 唯一任务的标识（默认使用函数名）
+    - coalesce_s / max_latency_s: 唯一任务的合并窗口与最长延迟（秒），0 表示立即执行
     说明：
-    - 非唯一任务插入方式无意义，忽略
+    - 非唯一任务插入方式与合并窗口无意义，忽略
     """
     k = key or getattr(action, "__name__", "task")
-    t = Task(action=action, args=args, kwargs=kwargs, unique=unique, insert_mode=insert_mode, key=k)
+    t = Task(action=action, args=args, kwargs=kwargs, unique=unique, insert_mode=insert_mode, key=k,
+             coalesce_s=max(0.0, float(coalesce_s)), max_latency_s=max(0.0, float(max_latency_s)))
     log("task_create: key={key} unique={unique} mode={mode}", key=t.key, unique=t.unique, mode=t.insert_mode)
     return t
 
@@ -16,6 +16,10 @@ class Task:
     - unique: 是否唯一（同 key 只保留一个）
     - insert_mode: 唯一任务插入策略（tail: 重复插入移至队尾；fixed: 保持原位置不变）
     - key: 唯一标识（默认使用函数名）
+    - coalesce_s: 合并窗口（秒，仅唯一任务）；入队后等待该时长再执行，期间重复入队会把执行时间顺延到最后一次入队后 coalesce_s
+    - max_latency_s: 合并的最长延迟（秒），从首次入队起算，顺延不超过该上限；0 表示等于 coalesce_s（窗口不顺延）
+    - merged: 执行前被合并的重复入队次数
+    - first_at / due: 首次入队与计划执行的时间（time.monotonic），由队列维护
     """
     action: Callable[..., Any]
     args: tuple
@@ -23,3 +27,8 @@ class Task:
     unique: bool
     insert_mode: InsertMode
     key: str
+    coalesce_s: float = 0.0
+    max_latency_s: float = 0.0
+    merged: int = 0
+    first_at: float = 0.0
+    due: float = 0.0
@@ -4,6 +4,7 @@
 from typing import Optional, Dict
 from collections import deque
 import threading
+import time
 from log_util import log
 from .task_models import Task
 
@@ -12,12 +13,15 @@ class TaskQueue:
     """
     任务队列
     - 独立运行，内部线程按序执行直到队列空
+    - 带合并窗口的唯一任务到期后才执行；等待期间按序执行其他已到期的任务
     """
     def __init__(self, name: str):
         self.name = name
         self._dq: deque[Task] = deque()
         self._unique_index: Dict[str, Task] = {}
         self._lock = threading.Lock()
+        # 新任务入队或执行时间提前时唤醒等待中的工作线程；工作线程结束时唤醒 join()
+        self._cond = threading.Condition(self._lock)
         self._running = False
         self._worker: Optional[threading.Thread] = None
         log("queue_create: {name}", name=self.name)
@@ -31,18 +35,35 @@ class TaskQueue:
             self._worker.start()
             log("worker_start: {name}", name=self.name)
 
+    def _take(self) -> Optional[Task]:
+        """
+        取出第一个已到期的任务；队列为空时返回 None（须持有锁）
+        """
+        while self._dq:
+            now = time.monotonic()
+            task = next((t for t in self._dq if t.due <= now), None)
+            if task is not None:
+                self._dq.remove(task)
+                if task.unique:
+                    # 唯一任务被取出后，从索引中移除
+                    self._unique_index.pop(task.key, None)
+                return task
+            self._cond.wait(timeout=min(t.due for t in self._dq) - now)
+        return None
+
     def _run(self):
         while True:
             task: Optional[Task] = None
             with self._lock:
-                if not self._dq:
+                task = self._take()
+                if task is None:
                     self._running = False
+                    self._cond.notify_all()
                     log("worker_done: {name}", name=self.name)
                     return
-                task = self._dq.popleft()
-                if task.unique:
-                    # 唯一任务被取出后，从索引中移除
-                    self._unique_index.pop(task.key, None)
+            if task.unique and task.coalesce_s > 0:
+                log("task_coalesced: queue={q} key={key} merged={merged} waited_ms={ms}",
+                    q=self.name, key=task.key, merged=task.merged, ms=int((time.monotonic() - task.first_at) * 1000))
             try:
                 log("task_start: queue={q} key={key}", q=self.name, key=task.key)
                 task.action(*task.args, **task.kwargs)
@@ -50,12 +71,38 @@ class TaskQueue:
             except Exception as e:
                 log("task_error: queue={q} key={key} err={err}", q=self.name, key=task.key, err=str(e))
 
+    def flush(self):
+        """
+        让所有等待合并的任务立即到期（例如退出前尽快推送）
+        """
+        with self._lock:
+            now = time.monotonic()
+            for t in self._dq:
+                t.due = min(t.due, now)
+            self._cond.notify_all()
+
+    def join(self, timeout: float) -> bool:
+        """
+        等待队列执行完所有任务（包括仍在合并窗口中的任务）；超时返回 False
+        """
+        with self._lock:
+            return self._cond.wait_for(lambda: not self._running, timeout=timeout)
+
     def insert(self, task: Task):
         with self._lock:
             op = "insert"
+            now = time.monotonic()
             if task.unique:
                 existing = self._unique_index.get(task.key)
                 if existing is not None:
+                    existing.merged += 1
+                    if task.coalesce_s <= 0:
+                        # 不合并的入队：立即执行已排队的任务
+                        existing.due = now
+                    elif existing.due > now:
+                        # 仍在窗口内：顺延到本次入队后 coalesce_s，但不超过首次入队 + max_latency_s
+                        cap = max(task.max_latency_s, task.coalesce_s)
+                        existing.due = min(now + task.coalesce_s, existing.first_at + cap)
                     if task.insert_mode == "tail":
                         # 将现有任务移动到队尾（保持唯一，不重复）
                         try:
@@ -70,13 +117,17 @@ class TaskQueue:
                     elif task.insert_mode == "fixed":
                         # 保持原位置，不做任何变更
                         op = "keep_order"
-                    log("enqueue_unique_dup: queue={q} key={key} op={op}", q=self.name, key=task.key, op=op)
+                    log("enqueue_unique_dup: queue={q} key={key} op={op} merged={merged}", q=self.name, key=task.key, op=op, merged=existing.merged)
                 else:
+                    task.first_at = now
+                    task.due = now + max(0.0, task.coalesce_s)
                     self._dq.append(task)
                     self._unique_index[task.key] = task
-                    log("enqueue_unique_new: queue={q} key={key}", q=self.name, key=task.key)
+                    log("enqueue_unique_new: queue={q} key={key} coalesce_s={s}", q=self.name, key=task.key, s=task.coalesce_s)
             else:
+                task.first_at = task.due = now
                 self._dq.append(task)
                 log("enqueue_normal: queue={q} key={key}", q=self.name, key=task.key)
+            self._cond.notify_all()
         # 自动启动
         self._start()
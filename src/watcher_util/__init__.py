@@ -2,6 +2,8 @@
 目录监控工具模块
 """
 from .watcher import Watcher
+from .inotify_watcher import InotifyWatcher
+from .file_index import FileIndex
 from .factory import create_watcher
 
-__all__ = ["Watcher", "create_watcher"]
+__all__ = ["Watcher", "InotifyWatcher", "FileIndex", "create_watcher"]
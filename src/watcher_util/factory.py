@@ -2,15 +2,37 @@
 监控器工厂函数
 """
 from pathlib import Path
-from typing import Callable, List, Iterable
+from typing import Callable, List, Iterable, Optional
+from log_util import log
 from .watcher import Watcher
+from .file_index import FileIndex
+from .inotify_watcher import InotifyWatcher, inotify_available
 
+# 可选后端：auto（优先 inotify，不可用时轮询）/ inotify / polling
+WATCHER_BACKENDS = ("auto", "inotify", "polling")
 
-def create_watcher(paths: Iterable[str | Path], callback: Callable[[str, List[str], List[str], List[str]], None], interval_ms: int = 1000) -> Watcher:
+
+def create_watcher(paths: Iterable[str | Path], callback: Callable[[str, List[str], List[str], List[str]], None], interval_ms: int = 1000, backend: str = "auto", index: Optional[FileIndex] = None, max_interval_ms: Optional[int] = None, backoff: float = 2.0, workers: int = 1, settle_ms: int = 0, settle_polls: int = 0, settle_max_ms: int = 60000) -> Watcher:
     """
     创建 watcher 并返回
     - paths: 初始监控目录（可为空列表）
     - callback: 当目录变化时的回调，传入 root 与三类变更
-    - interval_ms: 轮询间隔
+    - interval_ms: 轮询间隔（inotify 后端下为事件合并的最长延迟）
+    - backend: auto / inotify / polling；inotify 不可用时回退为轮询
+    - index: 可选的共享文件索引，嵌套根路径只遍历一次
+    - max_interval_ms/backoff: 轮询模式下根路径空闲时的退避上限与倍数（默认不退避）
+    - workers: 并行扫描根路径的线程数上限（默认 1，即顺序扫描）
+    - settle_ms/settle_polls/settle_max_ms: 写入静止检测，变化文件静止后才回调（默认不启用）
     """
-    return Watcher(paths, callback, interval_ms=interval_ms)
+    opts = dict(interval_ms=interval_ms, index=index, max_interval_ms=max_interval_ms, backoff=backoff, workers=workers,
+                settle_ms=settle_ms, settle_polls=settle_polls, settle_max_ms=settle_max_ms)
+    name = (backend or "auto").strip().lower()
+    if name not in WATCHER_BACKENDS:
+        log("watcher_backend_unknown: {backend} fallback=auto", backend=backend)
+        name = "auto"
+    if name != "polling":
+        if inotify_available():
+            return InotifyWatcher(paths, callback, **opts)
+        if name == "inotify":
+            log("watcher_backend_unavailable: inotify fallback=polling")
+    return Watcher(paths, callback, **opts)
@@ -0,0 +1,283 @@
+"""
+共享文件索引
+- 多个根路径互相嵌套时（如 test/save1 与 test/save1/save2），只遍历最外层根路径
+- 每个根路径得到最外层快照的过滤视图，备份、同步、哈希与监控共用同一份遍历结果
+- 根路径可附带 allow/deny 过滤器：遍历时剪掉所有根路径都不需要的目录，只 stat 候选文件
+"""
+from __future__ import annotations
+from pathlib import Path
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+import time
+from log_util import log
+from file_util import PathFilter
+from .scanner import DirScanner
+from .snapshot import CompactSnapshot, SnapshotEntry
+
+
+def _covers(top: str, key: str) -> bool:
+    return key == top or key.startswith(top + "/")
+
+
+def _accepts(filters: Sequence[PathFilter], rel: str) -> bool:
+    return not filters or any(f.match(rel) for f in filters)
+
+
+class _TopFilter:
+    """
+    最外层根路径的合并过滤器：任一被覆盖的根路径需要的目录/文件都保留
+    """
+    def __init__(self, members: List[Tuple[str, Sequence[PathFilter]]]):
+        # (相对最外层根路径的偏移, 过滤器列表)
+        self._members = members
+
+    def match(self, rel: str) -> bool:
+        for off, filters in self._members:
+            if not off:
+                if _accepts(filters, rel):
+                    return True
+            elif rel.startswith(off + "/") and _accepts(filters, rel[len(off) + 1:]):
+                return True
+        return False
+
+    def want_dir(self, rel_dir: str) -> bool:
+        for off, filters in self._members:
+            if not off:
+                sub = rel_dir
+            elif rel_dir == off:
+                return True
+            elif rel_dir.startswith(off + "/"):
+                sub = rel_dir[len(off) + 1:]
+            elif off.startswith(rel_dir + "/"):
+                # 嵌套根路径的祖先目录必须遍历
+                return True
+            else:
+                continue
+            if not filters or any(f.want_dir(sub) for f in filters):
+                return True
+        return False
+
+
+class FileIndex:
+    """
+    文件索引
+    - set_roots: 设置根路径，计算互不包含的最外层根路径
+    - refresh: 遍历最外层根路径（每个物理目录每轮只遍历一次）
+    - snapshot/files: 返回某个根路径的视图
+    - attach/detach: 由 Watcher 维护索引时标记为“在线”，此时 ensure_fresh 不再重复遍历
+    """
+    def __init__(self, roots: Iterable[str | Path] = (), filters: Optional[Dict[str | Path, Sequence[PathFilter]]] = None):
+        self._lock = threading.Lock()
+        # 每个最外层根路径一把扫描锁（DirScanner 非线程安全；不同根路径可并行扫描）
+        self._scan_locks: Dict[str, threading.Lock] = {}
+        self._roots: Dict[str, Path] = {}
+        # 根路径 -> 过滤器列表（任一通过即保留；为空表示不过滤）
+        self._filters: Dict[str, Tuple[PathFilter, ...]] = {}
+        # 最外层根路径 -> 被其覆盖的根路径
+        self._tops: Dict[str, List[str]] = {}
+        self._scanners: Dict[str, DirScanner] = {}
+        self._snaps: Dict[str, CompactSnapshot] = {}
+        self._views: Dict[str, CompactSnapshot] = {}
+        self._stale = True
+        self._attached = 0
+        self.walks = 0
+        # 最外层根路径 -> 最近一次遍历耗时（毫秒）
+        self.durations: Dict[str, float] = {}
+        self.set_roots(roots, filters)
+
+    def set_roots(self, roots: Iterable[str | Path], filters: Optional[Dict[str | Path, Sequence[PathFilter]]] = None):
+        """
+        设置索引覆盖的根路径与各自的过滤器；集合或过滤器变化时索引需重新遍历
+        - filters: 根路径 -> 过滤器列表（同一目录被多个游戏条目使用时，任一通过即保留）
+        """
+        new_roots: Dict[str, Path] = {}
+        for r in roots:
+            rp = Path(r).resolve()
+            new_roots[rp.as_posix()] = rp
+        new_filters: Dict[str, Tuple[PathFilter, ...]] = {}
+        for r, fs in (filters or {}).items():
+            fs = tuple(fs)
+            # 任一过滤器为空即等价于不过滤
+            if fs and not any(f.is_empty for f in fs):
+                new_filters[Path(r).resolve().as_posix()] = fs
+        with self._lock:
+            if new_roots.keys() == self._roots.keys() and new_filters == self._filters:
+                return
+            self._roots = new_roots
+            self._filters = new_filters
+            dir_keys = sorted((k for k, p in new_roots.items() if not p.is_file()), key=len)
+            tops: Dict[str, List[str]] = {}
+            for key in sorted(new_roots, key=len):
+                top = next((t for t in tops if t in dir_keys and _covers(t, key)), None)
+                if top is None:
+                    tops[key] = [key]
+                else:
+                    tops[top].append(key)
+            self._tops = tops
+            self._scanners = {t: DirScanner(new_roots[t], self._top_filter(t)) for t in tops}
+            self._scan_locks = {t: threading.Lock() for t in tops}
+            self._snaps = {}
+            self.durations = {}
+            self._views.clear()
+            self._stale = True
+        log("file_index_roots: roots={n} tops={t}", n=len(new_roots), t=len(self._tops))
+
+    def _top_filter(self, top: str) -> Optional[_TopFilter]:
+        # 最外层根路径本身不过滤时整棵树都需要遍历，嵌套根路径在取视图时再过滤
+        if not self._filters.get(top):
+            return None
+        return _TopFilter([(key[len(top) + 1:], self._filters.get(key, ())) for key in self._tops[top]])
+
+    def _key(self, root: str | Path) -> str:
+        if isinstance(root, str) and root in self._roots:
+            return root
+        return Path(root).resolve().as_posix()
+
+    def has_root(self, root: str | Path) -> bool:
+        """
+        根路径是否由索引覆盖
+        """
+        return self._key(root) in self._roots
+
+    def refresh(self, roots: Optional[Iterable[str | Path]] = None, executor: Optional[Executor] = None) -> List[str]:
+        """
+        遍历覆盖给定根路径（默认全部）的最外层根路径
+        - executor: 可选线程池，多个最外层根路径并行遍历
+        返回视图已刷新的根路径（包括被同一次遍历覆盖的嵌套根路径）
+        """
+        with self._lock:
+            if roots is None:
+                tops = list(self._tops)
+            else:
+                keys = {self._key(r) for r in roots}
+                tops = [t for t, ks in self._tops.items() if any(k in keys for k in ks)]
+            jobs = [(t, self._scanners[t], self._scan_locks[t]) for t in tops]
+        if executor is not None and len(jobs) > 1:
+            futures = [executor.submit(self._scan_top, *job) for job in jobs]
+            results = [f.result() for f in futures]
+        else:
+            results = [self._scan_top(*job) for job in jobs]
+        refreshed: List[str] = []
+        for keys in results:
+            refreshed.extend(keys)
+        if roots is None:
+            with self._lock:
+                self._stale = False
+        return refreshed
+
+    def _scan_top(self, top: str, scanner: DirScanner, lock: threading.Lock) -> List[str]:
+        t0 = time.perf_counter()
+        with lock:
+            snap = scanner.scan()
+        cost_ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            if self._scanners.get(top) is not scanner:
+                # 扫描期间根路径集合已变化
+                return []
+            self.walks += 1
+            self.durations[top] = cost_ms
+            self._snaps[top] = snap
+            for key in self._tops[top]:
+                self._views.pop(key, None)
+            return list(self._tops[top])
+
+    def duration_of(self, root: str | Path) -> Optional[float]:
+        """
+        覆盖该根路径的最外层根路径最近一次遍历耗时（毫秒）
+        """
+        key = self._key(root)
+        with self._lock:
+            top = next((t for t, ks in self._tops.items() if key in ks), None)
+            return self.durations.get(top) if top is not None else None
+
+    def update_entries(self, entries: Dict[str, Optional[SnapshotEntry]]):
+        """
+        以增量方式更新索引（供事件驱动的监控器使用）；值为 None 表示文件已删除
+        """
+        with self._lock:
+            for top, keys in self._tops.items():
+                part = {p: se for p, se in entries.items() if _covers(top, p)}
+                if not part:
+                    continue
+                self._snaps[top] = self._snaps.get(top, CompactSnapshot.empty()).with_updates(part)
+                for key in keys:
+                    self._views.pop(key, None)
+
+    def snapshot(self, root: str | Path) -> CompactSnapshot:
+        """
+        返回根路径的视图（文件路径 -> (mtime_ns, size)）；调用方不得修改返回值
+        """
+        key = self._key(root)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                return view
+            top = next((t for t, ks in self._tops.items() if key in ks), None)
+            if top is None:
+                return CompactSnapshot.empty()
+            snap = self._snaps.get(top, CompactSnapshot.empty())
+            filters = self._filters.get(key, ())
+            if key == top and (len(self._tops[top]) == 1 or not filters):
+                view = snap
+            else:
+                view = snap.subtree(key, (lambda rel: _accepts(filters, rel)) if filters else None)
+            self._views[key] = view
+            return view
+
+    def accepts(self, root: str | Path, path: str) -> bool:
+        """
+        文件路径是否属于根路径的视图（通过该根路径的过滤器）
+        """
+        key = self._key(root)
+        if path == key:
+            return True
+        if not path.startswith(key + "/"):
+            return False
+        return _accepts(self._filters.get(key, ()), path[len(key) + 1:])
+
+    def wants_dir(self, path: str) -> bool:
+        """
+        目录是否需要遍历/监控（至少一个根路径可能需要其中的文件）
+        """
+        with self._lock:
+            for top in self._tops:
+                if not _covers(top, path):
+                    continue
+                scanner = self._scanners.get(top)
+                flt = scanner.path_filter if scanner is not None else None
+                if flt is None or path == top or flt.want_dir(path[len(top) + 1:]):
+                    return True
+        return False
+
+    def files(self, root: str | Path) -> List[Path]:
+        """
+        返回根路径下的全部文件
+        """
+        return [Path(p) for p in self.snapshot(root)]
+
+    def invalidate(self):
+        """
+        标记索引过期（例如外部写入了被监控目录）
+        """
+        with self._lock:
+            self._stale = True
+
+    def ensure_fresh(self):
+        """
+        索引过期且没有监控器维护时才重新遍历
+        """
+        with self._lock:
+            need = self._stale and self._attached == 0
+        if need:
+            self.refresh()
+
+    def attach(self):
+        with self._lock:
+            self._attached += 1
+
+    def detach(self):
+        with self._lock:
+            self._attached = max(0, self._attached - 1)
+            # 监控器停止后索引不再被持续维护
+            self._stale = True
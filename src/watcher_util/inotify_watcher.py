@@ -0,0 +1,414 @@
+"""
+基于 Linux inotify 的目录监控
+- 通过 ctypes 调用 libc，不依赖第三方库
+- 事件只用于标记“脏路径”，回调前再 stat 并与快照比较，保证与轮询实现相同的回调契约
+- 新建子目录自动递归加监控；事件队列溢出或无法加监控时回退为一次性重扫
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from log_util import log
+from file_util import STAGING_SUFFIX
+from .watcher import Watcher
+from .file_index import FileIndex
+from .snapshot import CompactSnapshot
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+# 收到事件后等待后续事件的合并窗口（毫秒）
+_BATCH_MS = 100
+
+_LIBC = None
+
+
+def _libc():
+    global _LIBC
+    if _LIBC is None:
+        name = ctypes.util.find_library("c") or "libc.so.6"
+        lib = ctypes.CDLL(name, use_errno=True)
+        lib.inotify_init1.argtypes = [ctypes.c_int]
+        lib.inotify_init1.restype = ctypes.c_int
+        lib.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        lib.inotify_add_watch.restype = ctypes.c_int
+        lib.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        lib.inotify_rm_watch.restype = ctypes.c_int
+        _LIBC = lib
+    return _LIBC
+
+
+def inotify_available() -> bool:
+    """
+    当前平台是否可用 inotify
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        lib = _libc()
+        return hasattr(lib, "inotify_init1") and hasattr(lib, "inotify_add_watch")
+    except Exception:
+        return False
+
+
+class InotifyWatcher(Watcher):
+    """
+    inotify 目录监听器
+    - 与 Watcher 相同的 start/pause/resume/release 与 add/remove 目录接口
+    - 暂停期间继续收集事件，恢复后一次性回调
+    - 无法建立监控的根路径（不存在、监控数超限等）按 interval_ms 轮询并重试建立监控
+    - 启用静止检测时，每个 interval_ms 重新 stat 一次未静止的文件作为一次观测
+    """
+    def __init__(self, roots: Iterable[str | Path], callback: Callable[[str, List[str], List[str], List[str]], None], interval_ms: int = 1000, index: Optional[FileIndex] = None, max_interval_ms: Optional[int] = None, backoff: float = 2.0, workers: int = 1, settle_ms: int = 0, settle_polls: int = 0, settle_max_ms: int = 60000):
+        super().__init__(roots, callback, interval_ms=interval_ms, index=index, max_interval_ms=max_interval_ms, backoff=backoff, workers=workers, settle_ms=settle_ms, settle_polls=settle_polls, settle_max_ms=settle_max_ms)
+        self._fd: Optional[int] = None
+        self._wd_to_dir: Dict[int, str] = {}
+        self._dir_to_wd: Dict[str, int] = {}
+        # 根路径 -> 待确认的脏路径
+        self._dirty: Dict[str, Set[str]] = {}
+        # 需要整体重扫的根路径（溢出/监控丢失）
+        self._rescan: Set[str] = set()
+        # 无法建立监控、退化为轮询的根路径
+        self._polled: Set[str] = set()
+        # 单文件根路径（监控其父目录）
+        self._file_keys: Set[str] = set()
+        self._last_poll = 0.0
+        self._pending_since: Optional[float] = None
+        self._last_settle_check = 0.0
+
+    def start(self):
+        """
+        创建 inotify 实例、为所有根路径建立监控并启动监听线程
+        """
+        with self._lock:
+            if self._running:
+                return
+            fd = _libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                log("inotify_init_fail: err={err} fallback=polling", err=os.strerror(ctypes.get_errno()))
+        if self._fd is None:
+            super().start()
+            return
+        with self._lock:
+            self._running = True
+            self._paused = False
+            # 先建立监控再构建快照，避免两者之间的变更丢失
+            for key, root in self._roots.items():
+                self._watch_root(key, root)
+            if self._index is not None:
+                self._index.attach()
+            self._snapshots.update(self._scan_all([(key, self._scanner(key, root)) for key, root in self._roots.items()]))
+            self._thread = threading.Thread(target=self._run, name="WatcherThread", daemon=True)
+            self._thread.start()
+            log("watcher_start: roots={n} backend=inotify polled={p}", n=len(self._roots), p=len(self._polled))
+
+    def release(self):
+        """
+        停止并释放 inotify 实例
+        """
+        super().release()
+        with self._lock:
+            if self._fd is not None:
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+                self._fd = None
+            self._wd_to_dir.clear()
+            self._dir_to_wd.clear()
+
+    def add_path(self, path: str | Path):
+        rp = Path(path).resolve()
+        key = rp.as_posix()
+        with self._lock:
+            if key not in self._roots and self._fd is not None:
+                self._watch_root(key, rp)
+        super().add_path(rp)
+
+    def remove_path(self, path: str | Path):
+        super().remove_path(path)
+        key = Path(path).resolve().as_posix()
+        with self._lock:
+            self._dirty.pop(key, None)
+            self._rescan.discard(key)
+            self._polled.discard(key)
+            self._file_keys.discard(key)
+            if self._fd is None:
+                return
+            for d, wd in list(self._dir_to_wd.items()):
+                if not self._covers_dir(d):
+                    _libc().inotify_rm_watch(self._fd, wd)
+                    self._dir_to_wd.pop(d, None)
+                    self._wd_to_dir.pop(wd, None)
+
+    def _covers_dir(self, d: str) -> bool:
+        for key, root in self._roots.items():
+            if key in self._file_keys:
+                if d == root.parent.as_posix():
+                    return True
+            elif d == key or d.startswith(key + "/"):
+                return True
+        return False
+
+    def _add_watch(self, d: str) -> bool:
+        wd = _libc().inotify_add_watch(self._fd, os.fsencode(d), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err != errno.ENOENT and err != errno.ENOTDIR:
+                log("inotify_add_watch_error: {path} err={err}", path=d, err=os.strerror(err))
+            return False
+        self._wd_to_dir[wd] = d
+        self._dir_to_wd[d] = wd
+        return True
+
+    def _add_tree(self, top: str) -> List[str]:
+        """
+        递归为目录树加监控，返回树中已存在的文件（加监控前可能已写入）
+        """
+        files: List[str] = []
+        stack = [top]
+        while stack:
+            d = stack.pop()
+            # 被 allow/deny 整体排除的目录不加监控
+            if self._index is not None and d != top and not self._index.wants_dir(d):
+                continue
+            if not self._add_watch(d):
+                if d == top:
+                    return files
+                continue
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(f"{d}/{entry.name}")
+                        else:
+                            files.append(f"{d}/{entry.name}")
+            except OSError:
+                continue
+        return files
+
+    def _watch_root(self, key: str, root: Path):
+        """
+        为根路径建立监控；单文件根路径监控其父目录（兼容替换式写入）
+        失败时退化为轮询
+        """
+        if root.is_file():
+            self._file_keys.add(key)
+            ok = self._add_watch(root.parent.as_posix())
+        elif root.is_dir():
+            self._file_keys.discard(key)
+            self._add_tree(key)
+            ok = key in self._dir_to_wd
+        else:
+            ok = False
+        if ok:
+            self._polled.discard(key)
+        elif key not in self._polled:
+            self._polled.add(key)
+            log("inotify_watch_fallback_poll: root={root}", root=key)
+
+    def _roots_for(self, path: str) -> List[str]:
+        return [k for k in self._roots if path == k or path.startswith(k + "/")]
+
+    def _mark_dirty(self, path: str):
+        # 原子复制的临时文件只会以重命名的形式出现在目标路径上
+        if path.endswith(STAGING_SUFFIX):
+            return
+        for key in self._roots_for(path):
+            # 不通过该根路径过滤器的文件直接丢弃，不会触发回调
+            if self._index is not None and self._index.has_root(key) and not self._index.accepts(key, path):
+                continue
+            self._dirty.setdefault(key, set()).add(path)
+
+    def _mark_dir_gone(self, d: str):
+        prefix = d + "/"
+        for key in self._roots_for(d):
+            snap = self._snapshots.get(key) or CompactSnapshot.empty()
+            self._dirty.setdefault(key, set()).update(p for p in snap if p.startswith(prefix))
+        for sub in [x for x in self._dir_to_wd if x == d or x.startswith(prefix)]:
+            wd = self._dir_to_wd.pop(sub)
+            self._wd_to_dir.pop(wd, None)
+
+    def _read_events(self):
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log("inotify_read_error: err={err}", err=str(e))
+            return
+        offset = 0
+        with self._lock:
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                self._handle_event(wd, mask, os.fsdecode(name))
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            log("inotify_queue_overflow: roots={n}", n=len(self._roots))
+            self._rescan.update(self._roots.keys())
+            return
+        d = self._wd_to_dir.get(wd)
+        if d is None:
+            return
+        if mask & IN_IGNORED or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # 被监控目录本身消失：整体重扫受影响的根路径
+            self._wd_to_dir.pop(wd, None)
+            if self._dir_to_wd.get(d) == wd:
+                self._dir_to_wd.pop(d, None)
+            inner = {k for k in self._roots if k == d or k.startswith(d + "/")}
+            self._rescan.update(self._roots_for(d))
+            self._rescan.update(inner)
+            # 根路径本身（或单文件根的父目录）消失：退化为轮询，待其重新出现后再建立监控
+            self._polled.update(inner)
+            return
+        if not name:
+            return
+        path = f"{d}/{name}"
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if self._index is not None and not self._index.wants_dir(path):
+                    return
+                for fp in self._add_tree(path):
+                    self._mark_dirty(fp)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._mark_dir_gone(path)
+            return
+        self._mark_dirty(path)
+
+    def _flush(self):
+        """
+        将脏路径与快照比较并回调；暂停期间保留待处理内容
+        """
+        with self._lock:
+            if self._paused:
+                return
+            dirty = self._dirty
+            self._dirty = {}
+            rescan = self._rescan
+            self._rescan = set()
+            if rescan:
+                for key in rescan:
+                    root = self._roots.get(key)
+                    if root is not None and key in self._polled and root.exists():
+                        self._watch_root(key, root)
+            items = {key: self._scanner(key, self._roots[key]) for key in set(dirty) | rescan if key in self._roots}
+        rescanned = self._scan_all([(key, items[key]) for key in sorted(items) if key in rescan])
+        for key in sorted(items):
+            try:
+                old_snap = self._snapshots.get(key) or CompactSnapshot.empty()
+                if key in rescanned:
+                    new_snap = rescanned[key]
+                elif key in rescan:
+                    continue
+                else:
+                    updates = {}
+                    for p in dirty.get(key, ()):
+                        try:
+                            st = os.stat(p)
+                        except OSError:
+                            updates[p] = None
+                            continue
+                        if os.path.isdir(p):
+                            continue
+                        updates[p] = (st.st_mtime_ns, st.st_size)
+                    new_snap = old_snap.with_updates(updates)
+                    if self._index is not None and self._index.has_root(key):
+                        self._index.update_entries(updates)
+                self._deliver(key, old_snap, new_snap, time.monotonic())
+            except Exception as e:
+                log("watcher_scan_error: root={root} err={err}", root=key, err=str(e))
+
+    def _poll_fallback(self):
+        """
+        对未能建立监控的根路径按间隔重扫，并尝试重新建立监控
+        """
+        now = time.monotonic()
+        if now - self._last_poll < self._interval / 1000.0:
+            return
+        self._last_poll = now
+        with self._lock:
+            polled = [k for k in self._polled if k in self._roots]
+            for key in polled:
+                root = self._roots[key]
+                if root.exists():
+                    self._watch_root(key, root)
+            self._rescan.update(polled)
+
+    def _observe_unsettled(self):
+        """
+        按间隔把未静止的文件标记为脏路径，下次刷新时重新 stat 作为一次观测
+        """
+        now = time.monotonic()
+        if now - self._last_settle_check < self._interval / 1000.0:
+            return
+        self._last_settle_check = now
+        with self._lock:
+            for key in self._settle.pending_roots():
+                if key in self._roots:
+                    self._dirty.setdefault(key, set()).update(self._settle.pending_paths(key))
+
+    def _run(self):
+        if self._fd is None:
+            # inotify 初始化失败：按轮询方式运行
+            super()._run()
+            return
+        while True:
+            with self._lock:
+                if not self._running:
+                    break
+                fd = self._fd
+                pending = bool(self._dirty or self._rescan) and not self._paused
+            if fd is None:
+                break
+            timeout = _BATCH_MS / 1000.0 if pending else min(1.0, self._interval / 1000.0)
+            try:
+                readable, _, _ = select.select([fd], [], [], timeout)
+            except (OSError, ValueError):
+                break
+            now = time.monotonic()
+            if readable:
+                self._read_events()
+                if self._pending_since is None:
+                    self._pending_since = now
+                # 持续有事件时也不能无限推迟回调：超过 interval_ms 即刷新
+                if now - self._pending_since < self._interval / 1000.0:
+                    continue
+            if self._polled:
+                self._poll_fallback()
+            if self._settle.pending_roots():
+                self._observe_unsettled()
+            with self._lock:
+                flush = bool(self._dirty or self._rescan) and not self._paused
+            if flush:
+                self._pending_since = None
+                self._flush()
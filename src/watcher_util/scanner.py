@@ -0,0 +1,175 @@
+"""
+增量目录扫描器
+- 基于 os.scandir，直接复用 DirEntry 的类型信息，不再逐项 is_file/resolve
+- 记录每个目录的 mtime_ns：目录未变化时不重新列目录，只对已知文件做一次 stat
+- 目录 mtime 变化（新增/删除/重命名）时才重新列出该目录
+- 可选路径过滤器：被 allow/deny 排除的目录整体跳过，只对候选文件 stat
+- 目录状态直接以并行数组保存，扫描结果为 CompactSnapshot
+- 原子复制的临时文件（file_util.STAGING_SUFFIX）不计入快照
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol
+import os
+import time
+from log_util import log
+from file_util import STAGING_SUFFIX
+from .snapshot import CompactSnapshot
+
+# 目录 mtime 距列目录时刻过近时不可信（粗粒度文件系统上同一时间片内的新增不会改变 mtime）
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+class ScanFilter(Protocol):
+    """扫描过滤器接口（file_util.PathFilter 即满足该接口）"""
+    def match(self, rel: str) -> bool: ...
+    def want_dir(self, rel_dir: str) -> bool: ...
+
+
+@dataclass
+class _DirState:
+    """
+    单个目录的扫描状态
+    - mtime_ns: 列目录时的目录 mtime；None 表示下次必须重新列目录
+    - names/mtimes/sizes: 排序后的文件名与对应的 mtime_ns、size
+    - subdirs: 子目录名列表
+    """
+    mtime_ns: Optional[int]
+    names: List[str] = field(default_factory=list)
+    mtimes: array = field(default_factory=lambda: array("q"))
+    sizes: array = field(default_factory=lambda: array("q"))
+    subdirs: List[str] = field(default_factory=list)
+
+
+class DirScanner:
+    """
+    单个根目录的增量扫描器
+    - scan() 返回与 build_snapshot 相同语义的 CompactSnapshot（文件路径 -> (mtime_ns, size)）
+    - 根路径可以是目录或单个文件
+    - path_filter: 可选过滤器，按相对根路径的 posix 路径判断
+    - 非线程安全：同一实例只应由一个线程调用
+    """
+    def __init__(self, root: Path, path_filter: Optional[ScanFilter] = None):
+        self.root = root
+        self.path_filter = path_filter
+        self._root_key = root.as_posix()
+        self._dirs: Dict[str, _DirState] = {}
+
+    def reset(self):
+        """
+        丢弃已缓存的目录状态，下次扫描重新列出全部目录
+        """
+        self._dirs.clear()
+
+    def scan(self) -> CompactSnapshot:
+        """
+        扫描根路径并返回最新快照
+        """
+        try:
+            st = os.stat(self._root_key)
+        except FileNotFoundError:
+            self._dirs.clear()
+            return CompactSnapshot.empty()
+        except OSError as e:
+            log("stat_error: {path} err={err}", path=self._root_key, err=str(e))
+            return CompactSnapshot.empty()
+        if not os.path.isdir(self._root_key):
+            self._dirs.clear()
+            parent, _, name = self._root_key.rpartition("/")
+            return CompactSnapshot.from_parts([(parent, [name], array("q", [st.st_mtime_ns]), array("q", [st.st_size]))])
+        parts = []
+        seen = set()
+        stack = [self._root_key]
+        while stack:
+            d = stack.pop()
+            state = self._scan_dir(d)
+            if state is None:
+                continue
+            seen.add(d)
+            parts.append((d, state.names, state.mtimes, state.sizes))
+            for sub in state.subdirs:
+                stack.append(f"{d}/{sub}")
+        # 丢弃已消失目录的状态
+        if len(seen) != len(self._dirs):
+            for d in [d for d in self._dirs if d not in seen]:
+                del self._dirs[d]
+        return CompactSnapshot.from_parts(parts)
+
+    def _scan_dir(self, d: str) -> Optional[_DirState]:
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+        except OSError:
+            return None
+        state = self._dirs.get(d)
+        if state is not None and state.mtime_ns is not None and state.mtime_ns == mtime_ns:
+            self._restat(d, state)
+            return state
+        state = self._list_dir(d, mtime_ns)
+        if state is not None:
+            self._dirs[d] = state
+        return state
+
+    def _list_dir(self, d: str, mtime_ns: int) -> Optional[_DirState]:
+        """
+        重新列出目录，文件状态直接取自 DirEntry
+        """
+        state = _DirState(mtime_ns=mtime_ns)
+        if time.time_ns() - mtime_ns < _RACY_WINDOW_NS:
+            state.mtime_ns = None
+        flt = self.path_filter
+        rel_dir = d[len(self._root_key) + 1:] if d != self._root_key else ""
+        files = []
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            # 剪枝：整个目录不可能包含候选文件
+                            if flt is None or flt.want_dir(rel):
+                                state.subdirs.append(entry.name)
+                        elif entry.is_file():
+                            if entry.name.endswith(STAGING_SUFFIX) or (flt is not None and not flt.match(rel)):
+                                continue
+                            st = entry.stat()
+                            files.append((entry.name, st.st_mtime_ns, st.st_size))
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        log("stat_error: {path} err={err}", path=f"{d}/{entry.name}", err=str(e))
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log("scandir_error: {path} err={err}", path=d, err=str(e))
+            return None
+        files.sort()
+        state.names = [f[0] for f in files]
+        state.mtimes = array("q", [f[1] for f in files])
+        state.sizes = array("q", [f[2] for f in files])
+        return state
+
+    def _restat(self, d: str, state: _DirState):
+        """
+        目录未变化：已知文件逐个 stat（原地写入不会改变目录 mtime）
+        """
+        missing = []
+        mtimes, sizes = state.mtimes, state.sizes
+        for i, name in enumerate(state.names):
+            try:
+                st = os.stat(f"{d}/{name}")
+                mtimes[i] = st.st_mtime_ns
+                sizes[i] = st.st_size
+            except FileNotFoundError:
+                missing.append(i)
+            except OSError as e:
+                log("stat_error: {path} err={err}", path=f"{d}/{name}", err=str(e))
+        if missing:
+            # 目录 mtime 未能反映删除：移除并要求下次重新列目录
+            gone = set(missing)
+            keep = [i for i in range(len(state.names)) if i not in gone]
+            state.names = [state.names[i] for i in keep]
+            state.mtimes = array("q", [mtimes[i] for i in keep])
+            state.sizes = array("q", [sizes[i] for i in keep])
+            state.mtime_ns = None
@@ -0,0 +1,83 @@
+"""
+写入静止检测
+- 游戏常分多次写入存档，或先写临时文件再重命名；写入过程中触发同步会复制半成品并重复提交
+- 按文件记录最近一次变化时刻与此后连续未变化的观测次数
+- 根路径内全部待定文件都静止后，才发出相对上次发出快照的净变化（中间状态被折叠）
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+from log_util import log
+from .snapshot import CompactSnapshot
+from .watcher_helpers import compare_snapshots
+
+ChangeSet = Tuple[List[str], List[str], List[str]]
+
+
+class SettleTracker:
+    """
+    静止检测器（非线程安全，由监控线程独占使用）
+    - settle_ms: 文件最近一次变化后至少经过的时间
+    - settle_polls: 文件最近一次变化后至少连续未变化的观测次数
+    - max_wait_ms: 根路径持续有写入时的最长等待，超过后强制发出，避免持续写入的文件永远不同步
+    - 两个阈值都为 0 时不启用，observe 直接返回本次变化
+    """
+    def __init__(self, settle_ms: int = 0, settle_polls: int = 0, max_wait_ms: int = 60000):
+        self._settle_s = max(0, int(settle_ms)) / 1000.0
+        self._polls = max(0, int(settle_polls))
+        self._max_wait_s = max(self._settle_s, max(0, int(max_wait_ms)) / 1000.0)
+        # 根路径 -> 上次发出时的快照
+        self._baseline: Dict[str, CompactSnapshot] = {}
+        # 根路径 -> {文件路径: [连续未变化次数, 最近变化时刻]}
+        self._pending: Dict[str, Dict[str, List[float]]] = {}
+        # 根路径 -> 首次出现待定变化的时刻
+        self._since: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._settle_s > 0 or self._polls > 0
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending
+
+    def pending_roots(self) -> List[str]:
+        return list(self._pending)
+
+    def pending_paths(self, key: str) -> List[str]:
+        return list(self._pending.get(key, ()))
+
+    def forget(self, key: str):
+        self._baseline.pop(key, None)
+        self._pending.pop(key, None)
+        self._since.pop(key, None)
+
+    def observe(self, key: str, old: CompactSnapshot, new: CompactSnapshot, changed: Sequence[str], now: float) -> Optional[ChangeSet]:
+        """
+        记录一次观测；old/new 为本次观测前后的快照，changed 为两者之间变化的文件
+        返回可以发出的变化集合（可能为空集合），尚未静止时返回 None
+        """
+        if not self.enabled:
+            return compare_snapshots(old, new) if changed else None
+        files = self._pending.get(key)
+        if files is None:
+            if not changed:
+                return None
+            files = self._pending[key] = {}
+            self._baseline[key] = old
+            self._since[key] = now
+        changed_set = set(changed)
+        for state in files.values():
+            state[0] += 1
+        for p in changed_set:
+            files[p] = [0, now]
+        settled = all(c >= self._polls and now - t >= self._settle_s for c, t in files.values())
+        waited = now - self._since[key]
+        if not settled and waited < self._max_wait_s:
+            return None
+        base = self._baseline.pop(key)
+        self._pending.pop(key, None)
+        self._since.pop(key, None)
+        if settled:
+            log("watcher_settled: root={root} files={n} waited_ms={ms}", root=key, n=len(files), ms=int(waited * 1000))
+        else:
+            log("watcher_settle_timeout: root={root} files={n} waited_ms={ms}", root=key, n=len(files), ms=int(waited * 1000))
+        return compare_snapshots(base, new)
@@ -0,0 +1,274 @@
+"""
+紧凑快照
+- 目录前缀只保存一次（按目录排序），文件按 (目录, 文件名) 排序后用并行数组保存 mtime_ns 与 size
+- 文件名字符串与扫描器共享，不再为每个文件保存完整路径字符串与 (mtime, size) 元组
+- 比较按目录分组：两边目录内容完全相同时整段跳过（切片比较在 C 层完成），否则在目录内做归并
+"""
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+SnapshotEntry = Tuple[int, int]  # (mtime_ns, size)
+
+
+class CompactSnapshot(Mapping[str, SnapshotEntry]):
+    """
+    只读快照（路径 -> (mtime_ns, size)），实现 Mapping 接口
+    - dirs: 排序后的目录路径
+    - offsets: 每个目录在并行数组中的起止位置（长度为 len(dirs) + 1）
+    - names/mtimes/sizes: 并行数组，目录内按文件名排序
+    """
+    __slots__ = ("dirs", "offsets", "names", "mtimes", "sizes", "_dir_pos")
+
+    def __init__(self, dirs: List[str], offsets: array, names: List[str], mtimes: array, sizes: array):
+        self.dirs = dirs
+        self.offsets = offsets
+        self.names = names
+        self.mtimes = mtimes
+        self.sizes = sizes
+        self._dir_pos: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def empty(cls) -> "CompactSnapshot":
+        return cls([], array("Q", [0]), [], array("q"), array("q"))
+
+    @classmethod
+    def from_parts(cls, parts: Iterable[Tuple[str, Sequence[str], Sequence[int], Sequence[int]]]) -> "CompactSnapshot":
+        """
+        由 (目录, 排序后的文件名, mtime_ns 序列, size 序列) 构建；目录无需预先排序
+        """
+        dirs: List[str] = []
+        offsets = array("Q", [0])
+        names: List[str] = []
+        mtimes = array("q")
+        sizes = array("q")
+        for d, ns, ms, ss in sorted((p for p in parts if len(p[1])), key=lambda p: p[0]):
+            dirs.append(d)
+            names.extend(ns)
+            mtimes.extend(ms)
+            sizes.extend(ss)
+            offsets.append(len(names))
+        return cls(dirs, offsets, names, mtimes, sizes)
+
+    @classmethod
+    def from_dict(cls, snap: Mapping[str, SnapshotEntry]) -> "CompactSnapshot":
+        """
+        由 路径 -> (mtime_ns, size) 字典构建
+        """
+        if isinstance(snap, CompactSnapshot):
+            return snap
+        groups: Dict[str, List[Tuple[str, int, int]]] = {}
+        for path, (mt, sz) in snap.items():
+            d, _, name = path.rpartition("/")
+            groups.setdefault(d, []).append((name, mt, sz))
+        parts = []
+        for d, items in groups.items():
+            items.sort()
+            parts.append((d, [x[0] for x in items], array("q", [x[1] for x in items]), array("q", [x[2] for x in items])))
+        return cls.from_parts(parts)
+
+    # ---- Mapping 接口 ----
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[str]:
+        names = self.names
+        off = self.offsets
+        for di, d in enumerate(self.dirs):
+            for i in range(off[di], off[di + 1]):
+                yield f"{d}/{names[i]}"
+
+    def items(self):
+        names, mtimes, sizes, off = self.names, self.mtimes, self.sizes, self.offsets
+        for di, d in enumerate(self.dirs):
+            for i in range(off[di], off[di + 1]):
+                yield f"{d}/{names[i]}", (mtimes[i], sizes[i])
+
+    def _locate(self, path: str) -> int:
+        if self._dir_pos is None:
+            self._dir_pos = {d: i for i, d in enumerate(self.dirs)}
+        d, _, name = path.rpartition("/")
+        di = self._dir_pos.get(d)
+        if di is None:
+            return -1
+        lo, hi = self.offsets[di], self.offsets[di + 1]
+        i = bisect_left(self.names, name, lo, hi)
+        return i if i < hi and self.names[i] == name else -1
+
+    def __contains__(self, path: object) -> bool:
+        return isinstance(path, str) and self._locate(path) >= 0
+
+    def __getitem__(self, path: str) -> SnapshotEntry:
+        i = self._locate(path)
+        if i < 0:
+            raise KeyError(path)
+        return (self.mtimes[i], self.sizes[i])
+
+    def get(self, path, default=None):
+        i = self._locate(path) if isinstance(path, str) else -1
+        return (self.mtimes[i], self.sizes[i]) if i >= 0 else default
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CompactSnapshot):
+            return (self.dirs == other.dirs and self.offsets == other.offsets and self.names == other.names
+                    and self.mtimes == other.mtimes and self.sizes == other.sizes)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    # ---- 派生快照 ----
+
+    def _dir_slices(self) -> Iterator[Tuple[str, int, int]]:
+        off = self.offsets
+        for di, d in enumerate(self.dirs):
+            yield d, off[di], off[di + 1]
+
+    def subtree(self, root: str, accept: Optional[Callable[[str], bool]] = None) -> "CompactSnapshot":
+        """
+        取 root 下（含 root 本身作为文件时）的子快照；accept 以相对 root 的路径过滤文件
+        """
+        prefix = root + "/"
+        parent, _, leaf = root.rpartition("/")
+        parts = []
+        for d, s, e in self._dir_slices():
+            if d == root or d.startswith(prefix):
+                ns, ms, ss = self.names[s:e], self.mtimes[s:e], self.sizes[s:e]
+                if accept is not None:
+                    rel_dir = d[len(prefix):] if d != root else ""
+                    keep = [i for i, n in enumerate(ns) if accept(f"{rel_dir}/{n}" if rel_dir else n)]
+                    if len(keep) != len(ns):
+                        ns = [ns[i] for i in keep]
+                        ms = array("q", [ms[i] for i in keep])
+                        ss = array("q", [ss[i] for i in keep])
+                parts.append((d, ns, ms, ss))
+            elif d == parent:
+                # root 本身是文件
+                i = bisect_left(self.names, leaf, s, e)
+                if i < e and self.names[i] == leaf:
+                    parts.append((d, [leaf], self.mtimes[i:i + 1], self.sizes[i:i + 1]))
+        return CompactSnapshot.from_parts(parts)
+
+    def with_updates(self, updates: Mapping[str, Optional[SnapshotEntry]]) -> "CompactSnapshot":
+        """
+        返回应用增量更新后的新快照（值为 None 表示删除）
+        - 只有受影响的目录在 Python 中逐文件重建；相邻的未受影响目录作为连续区段整体切片拷贝，
+          不再逐目录重新排序拼装。新快照不可与旧快照共享数组，未受影响区段仍有 O(文件数) 的 C 层内存拷贝
+        """
+        if not updates:
+            return self
+        by_dir: Dict[str, Dict[str, Optional[SnapshotEntry]]] = {}
+        for path, se in updates.items():
+            d, _, name = path.rpartition("/")
+            by_dir.setdefault(d, {})[name] = se
+        dirs, off = self.dirs, self.offsets
+        new_dirs: List[str] = []
+        new_off = array("Q", [0])
+        names: List[str] = []
+        mtimes = array("q")
+        sizes = array("q")
+
+        def copy_run(a: int, b: int):
+            # 原样拷贝 dirs[a:b]，偏移整体平移
+            if a >= b:
+                return
+            s, e = off[a], off[b]
+            delta = len(names) - s
+            new_dirs.extend(dirs[a:b])
+            names.extend(self.names[s:e])
+            mtimes.extend(self.mtimes[s:e])
+            sizes.extend(self.sizes[s:e])
+            seg = off[a + 1:b + 1]
+            new_off.extend(seg if delta == 0 else array("Q", [o + delta for o in seg]))
+
+        cursor = 0
+        for d in sorted(by_dir):
+            di = bisect_left(dirs, d, cursor)
+            copy_run(cursor, di)
+            if di < len(dirs) and dirs[di] == d:
+                s, e = off[di], off[di + 1]
+                merged = dict(zip(self.names[s:e], zip(self.mtimes[s:e], self.sizes[s:e])))
+                cursor = di + 1
+            else:
+                merged = {}
+                cursor = di
+            _, ns, ms, ss = _merge_dir(d, merged, by_dir[d])
+            if ns:
+                new_dirs.append(d)
+                names.extend(ns)
+                mtimes.extend(ms)
+                sizes.extend(ss)
+                new_off.append(len(names))
+        copy_run(cursor, len(dirs))
+        return CompactSnapshot(new_dirs, new_off, names, mtimes, sizes)
+
+    def memory_bytes(self) -> int:
+        """
+        估算快照自身占用的字节数（不含与扫描器共享的文件名字符串）
+        """
+        return (self.offsets.itemsize * len(self.offsets) + self.mtimes.itemsize * len(self.mtimes)
+                + self.sizes.itemsize * len(self.sizes) + 8 * (len(self.names) + len(self.dirs)))
+
+
+def _merge_dir(d: str, merged: Dict[str, SnapshotEntry], upd: Mapping[str, Optional[SnapshotEntry]]):
+    for name, se in upd.items():
+        if se is None:
+            merged.pop(name, None)
+        else:
+            merged[name] = se
+    ns = sorted(merged)
+    return (d, ns, array("q", [merged[n][0] for n in ns]), array("q", [merged[n][1] for n in ns]))
+
+
+def diff_compact(old: CompactSnapshot, new: CompactSnapshot) -> Tuple[List[str], List[str], List[str]]:
+    """
+    按目录归并比较两个紧凑快照，返回排序后的 (created, modified, deleted)
+    """
+    created: List[str] = []
+    modified: List[str] = []
+    deleted: List[str] = []
+    od, nd = old.dirs, new.dirs
+    oo, no = old.offsets, new.offsets
+    i = j = 0
+    while i < len(od) or j < len(nd):
+        if j >= len(nd) or (i < len(od) and od[i] < nd[j]):
+            d = od[i]
+            deleted.extend(f"{d}/{n}" for n in old.names[oo[i]:oo[i + 1]])
+            i += 1
+            continue
+        if i >= len(od) or nd[j] < od[i]:
+            d = nd[j]
+            created.extend(f"{d}/{n}" for n in new.names[no[j]:no[j + 1]])
+            j += 1
+            continue
+        d = od[i]
+        s1, e1, s2, e2 = oo[i], oo[i + 1], no[j], no[j + 1]
+        on, nn = old.names[s1:e1], new.names[s2:e2]
+        if on == nn:
+            # 文件集合相同：整段比较 mtime/size，相同则整目录跳过
+            if old.mtimes[s1:e1] != new.mtimes[s2:e2] or old.sizes[s1:e1] != new.sizes[s2:e2]:
+                om, os_, nm, ns_ = old.mtimes, old.sizes, new.mtimes, new.sizes
+                for k in range(e1 - s1):
+                    if om[s1 + k] != nm[s2 + k] or os_[s1 + k] != ns_[s2 + k]:
+                        modified.append(f"{d}/{on[k]}")
+        else:
+            a = b = 0
+            while a < len(on) or b < len(nn):
+                if b >= len(nn) or (a < len(on) and on[a] < nn[b]):
+                    deleted.append(f"{d}/{on[a]}")
+                    a += 1
+                elif a >= len(on) or nn[b] < on[a]:
+                    created.append(f"{d}/{nn[b]}")
+                    b += 1
+                else:
+                    if old.mtimes[s1 + a] != new.mtimes[s2 + b] or old.sizes[s1 + a] != new.sizes[s2 + b]:
+                        modified.append(f"{d}/{on[a]}")
+                    a += 1
+                    b += 1
+        i += 1
+        j += 1
+    created.sort()
+    modified.sort()
+    deleted.sort()
+    return created, modified, deleted
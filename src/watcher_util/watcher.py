@@ -2,13 +2,21 @@
 简单轮询型目录监控
 - 不依赖第三方库，跨平台
 - 回调签名：callback(root: str, created: list[str], modified: list[str], deleted: list[str])
+- 每个根路径独立调度：持续空闲时轮询间隔按 backoff 指数退避到 max_interval_ms，发现变化立即回到 interval_ms
+- workers > 1 时多个根路径在有界线程池中并行扫描，回调仍按根路径排序依次触发
+- 启用静止检测（settle_ms/settle_polls）时，只在变化文件写入静止后回调一次净变化
 """
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Iterable
+from typing import Callable, Dict, List, Optional, Iterable, Tuple
 import threading
 import time
 from log_util import log
-from .watcher_helpers import build_snapshot, compare_snapshots, SnapshotEntry
+from .watcher_helpers import compare_snapshots
+from .snapshot import CompactSnapshot
+from .scanner import DirScanner
+from .file_index import FileIndex
+from .settle import SettleTracker
 
 
 class Watcher:
@@ -16,20 +24,38 @@ class Watcher:
     目录监听器
     - 支持多个目录
     - 提供 start/pause/resume/release 与 add/remove 目录
+    - 传入 index 时，被索引覆盖的根路径通过共享索引扫描（嵌套根路径只遍历一次）
+    - max_interval_ms 大于 interval_ms 时启用按根路径的自适应轮询间隔
+    - workers: 并行扫描的线程数上限；scan_durations() 返回各根路径最近一次扫描耗时
+    - settle_ms/settle_polls/settle_max_ms: 写入静止检测参数（见 SettleTracker），默认不启用
     """
-    def __init__(self, roots: Iterable[str | Path], callback: Callable[[str, List[str], List[str], List[str]], None], interval_ms: int = 1000):
+    def __init__(self, roots: Iterable[str | Path], callback: Callable[[str, List[str], List[str], List[str]], None], interval_ms: int = 1000, index: Optional[FileIndex] = None, max_interval_ms: Optional[int] = None, backoff: float = 2.0, workers: int = 1, settle_ms: int = 0, settle_polls: int = 0, settle_max_ms: int = 60000):
         self._roots: Dict[str, Path] = {}
         for r in roots:
             rp = Path(r).resolve()
             self._roots[rp.as_posix()] = rp
-        self._snapshots: Dict[str, Dict[str, SnapshotEntry]] = {}
+        self._snapshots: Dict[str, CompactSnapshot] = {}
+        # 每个根路径一个增量扫描器（缓存目录 mtime，避免每次全量列目录）
+        self._scanners: Dict[str, DirScanner] = {}
+        self._index = index
         self._callback = callback
         self._interval = max(100, int(interval_ms))
+        self._max_interval = max(self._interval, int(max_interval_ms or 0))
+        self._backoff = max(1.0, float(backoff))
+        # 根路径 -> 当前轮询间隔（毫秒）/ 下次到期时刻（monotonic 秒）
+        self._root_interval: Dict[str, float] = {}
+        self._next_due: Dict[str, float] = {}
         self._lock = threading.Lock()
+        self._wake = threading.Event()
         self._running = False
         self._paused = False
         self._thread: Optional[threading.Thread] = None
-        log("watcher_create: roots={n} interval_ms={ms}", n=len(self._roots), ms=self._interval)
+        self._workers = max(1, int(workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # 根路径 -> 最近一次扫描耗时（毫秒）
+        self._durations: Dict[str, float] = {}
+        self._settle = SettleTracker(settle_ms, settle_polls, settle_max_ms)
+        log("watcher_create: roots={n} interval_ms={ms} max_interval_ms={mx}", n=len(self._roots), ms=self._interval, mx=self._max_interval)
 
     def start(self):
         """
@@ -40,9 +66,16 @@ class Watcher:
                 return
             self._running = True
             self._paused = False
+            self._wake.clear()
+            if self._workers > 1 and len(self._roots) > 1:
+                self._pool = ThreadPoolExecutor(max_workers=min(self._workers, len(self._roots)), thread_name_prefix="WatcherScan")
             # 初始化快照
-            for key, root in self._roots.items():
-                self._snapshots[key] = build_snapshot(root)
+            if self._index is not None:
+                self._index.attach()
+            self._snapshots.update(self._scan_all([(key, self._scanner(key, root)) for key, root in self._roots.items()]))
+            now = time.monotonic()
+            for key in self._roots:
+                self._reschedule(key, True, now)
             self._thread = threading.Thread(target=self._run, name="WatcherThread", daemon=True)
             self._thread.start()
             log("watcher_start: roots={n}", n=len(self._roots))
@@ -62,17 +95,25 @@ class Watcher:
         with self._lock:
             self._paused = False
             log("watcher_resume")
+        self._wake.set()
 
     def release(self):
         """
         停止并释放资源
         """
         with self._lock:
+            was_running = self._running
             self._running = False
             self._paused = False
+        self._wake.set()
+        if was_running and self._index is not None:
+            self._index.detach()
         # 等待线程退出
         if self._thread is not None:
             self._thread.join(timeout=self._interval / 1000 + 1)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
         log("watcher_release")
 
     def add_path(self, path: str | Path):
@@ -83,7 +124,8 @@ class Watcher:
                 log("watcher_add_exist: {path}", path=key)
                 return
             self._roots[key] = rp
-            self._snapshots[key] = build_snapshot(rp)
+            self._snapshots.update(self._scan_all([(key, self._scanner(key, rp))]))
+            self._reschedule(key, True, time.monotonic())
             log("watcher_add_path: {path}", path=key)
 
     def remove_path(self, path: str | Path):
@@ -95,29 +137,128 @@ class Watcher:
                 return
             self._roots.pop(key, None)
             self._snapshots.pop(key, None)
+            self._scanners.pop(key, None)
+            self._root_interval.pop(key, None)
+            self._next_due.pop(key, None)
+            self._durations.pop(key, None)
+            self._settle.forget(key)
             log("watcher_remove_path: {path}", path=key)
 
+    def _scanner(self, key: str, root: Path) -> DirScanner:
+        sc = self._scanners.get(key)
+        if sc is None:
+            sc = DirScanner(root)
+            self._scanners[key] = sc
+        return sc
+
+    def scan_durations(self) -> Dict[str, float]:
+        """
+        返回各根路径最近一次扫描耗时（毫秒），用于定位慢目录
+        """
+        with self._lock:
+            return dict(self._durations)
+
+    def _timed_scan(self, key: str, scanner: DirScanner) -> Tuple[str, Optional[CompactSnapshot], float]:
+        t0 = time.perf_counter()
+        try:
+            snap = scanner.scan()
+        except Exception as e:
+            log("watcher_scan_error: root={root} err={err}", root=key, err=str(e))
+            snap = None
+        return key, snap, (time.perf_counter() - t0) * 1000.0
+
+    def _scan_all(self, items: List[Tuple[str, DirScanner]]) -> Dict[str, CompactSnapshot]:
+        """
+        扫描一组根路径；索引覆盖的根路径合并为一次索引刷新，其余根路径在线程池中并行扫描
+        """
+        result: Dict[str, CompactSnapshot] = {}
+        durations: Dict[str, float] = {}
+        indexed = set()
+        if self._index is not None:
+            indexed = {key for key, _ in items if self._index.has_root(key)}
+        pool = self._pool
+        plain = [(key, scanner) for key, scanner in items if key not in indexed]
+        futures = [pool.submit(self._timed_scan, key, scanner) for key, scanner in plain] if pool is not None and len(plain) > 1 else []
+        if indexed:
+            # 同一次遍历覆盖的其他根路径也一并比较（嵌套根路径无需额外遍历）
+            refreshed = self._index.refresh(indexed, executor=pool)
+            indexed.update(k for k in refreshed if k in self._roots)
+            for key in indexed:
+                result[key] = self._index.snapshot(key)
+                cost = self._index.duration_of(key)
+                if cost is not None:
+                    durations[key] = cost
+        scanned = [f.result() for f in futures] if futures else [self._timed_scan(key, scanner) for key, scanner in plain]
+        for key, snap, cost in scanned:
+            durations[key] = cost
+            if snap is not None:
+                result[key] = snap
+        for key, cost in durations.items():
+            if cost > self._interval:
+                log("watcher_slow_root: root={root} scan_ms={ms}", root=key, ms=int(cost))
+        self._durations.update(durations)
+        return result
+
+    def _deliver(self, key: str, old_snap: CompactSnapshot, new_snap: CompactSnapshot, now: float) -> bool:
+        """
+        比较快照、更新已观测快照，并在变化（启用静止检测时为静止后的净变化）非空时回调
+        返回根路径是否仍处于活跃状态（本次有变化或仍有未静止的文件）
+        """
+        created, modified, deleted = compare_snapshots(old_snap, new_snap)
+        changed = bool(created or modified or deleted)
+        if changed:
+            log("watcher_event: root={root} created={c} modified={m} deleted={d}", root=key, c=len(created), m=len(modified), d=len(deleted))
+        self._snapshots[key] = new_snap
+        if self._settle.enabled:
+            out = self._settle.observe(key, old_snap, new_snap, created + modified + deleted, now)
+        else:
+            out = (created, modified, deleted) if changed else None
+        if out is not None and any(out):
+            try:
+                self._callback(key, *out)
+            except Exception as e:
+                log("watcher_callback_error: {err}", err=str(e))
+        return changed or self._settle.is_pending(key)
+
+    def _reschedule(self, key: str, changed: bool, now: float):
+        """
+        更新根路径的轮询间隔：有变化回到最小间隔，否则指数退避直至上限
+        """
+        cur = self._root_interval.get(key, float(self._interval))
+        if changed:
+            nxt = float(self._interval)
+        else:
+            nxt = min(float(self._max_interval), cur * self._backoff)
+        if nxt != cur and (changed or nxt == self._max_interval) and key in self._root_interval:
+            log("watcher_interval: root={root} interval_ms={ms}", root=key, ms=int(nxt))
+        self._root_interval[key] = nxt
+        self._next_due[key] = now + nxt / 1000.0
+
     def _run(self):
         while True:
             with self._lock:
                 if not self._running:
                     break
                 paused = self._paused
-                roots_items = list(self._roots.items())
-            if not paused:
-                for key, root in roots_items:
+                now = time.monotonic()
+                due_items = [(key, self._scanner(key, root)) for key, root in self._roots.items() if self._next_due.get(key, 0.0) <= now]
+            if not paused and due_items:
+                new_snaps = self._scan_all(due_items)
+                now = time.monotonic()
+                for key, new_snap in sorted(new_snaps.items()):
+                    changed = False
                     try:
-                        new_snap = build_snapshot(root)
-                        old_snap = self._snapshots.get(key, {})
-                        created, modified, deleted = compare_snapshots(old_snap, new_snap)
-                        if created or modified or deleted:
-                            log("watcher_event: root={root} created={c} modified={m} deleted={d}", root=key, c=len(created), m=len(modified), d=len(deleted))
-                            # 调用外部回调
-                            try:
-                                self._callback(key, created, modified, deleted)
-                            except Exception as e:
-                                log("watcher_callback_error: {err}", err=str(e))
-                        self._snapshots[key] = new_snap
+                        old_snap = self._snapshots.get(key) or CompactSnapshot.empty()
+                        # 有未静止文件时保持最小间隔，继续观测
+                        changed = self._deliver(key, old_snap, new_snap, now)
                     except Exception as e:
                         log("watcher_scan_error: root={root} err={err}", root=key, err=str(e))
-            time.sleep(self._interval / 1000.0)
+                    with self._lock:
+                        if key in self._roots:
+                            self._reschedule(key, changed, now)
+            with self._lock:
+                now = time.monotonic()
+                pending = [self._next_due.get(k, 0.0) for k in self._roots]
+            wait_s = self._interval / 1000.0 if paused or not pending else max(0.0, min(pending) - now)
+            self._wake.wait(max(0.01, wait_s))
+            self._wake.clear()
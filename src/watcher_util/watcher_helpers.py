@@ -2,10 +2,9 @@
 监控器辅助函数
 """
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Mapping, Optional
 from log_util import log
-
-SnapshotEntry = Tuple[int, int]  # (mtime_ns, size)
+from .snapshot import SnapshotEntry, CompactSnapshot, diff_compact
 
 
 def safe_stat(p: Path) -> Optional[SnapshotEntry]:
@@ -18,30 +17,19 @@ def safe_stat(p: Path) -> Optional[SnapshotEntry]:
         return None
 
 
-def build_snapshot(root: Path) -> Dict[str, SnapshotEntry]:
+def build_snapshot(root: Path) -> CompactSnapshot:
     """
     递归构建目录快照（文件路径 -> (mtime_ns, size)）
-    支持传入目录或单个文件路径
+    支持传入目录或单个文件路径；需要反复扫描同一目录时请使用 DirScanner
     """
-    snap: Dict[str, SnapshotEntry] = {}
-    if not root.exists():
-        return snap
-    if root.is_file():
-        se = safe_stat(root)
-        if se is not None:
-            snap[root.resolve().as_posix()] = se
-        return snap
-    # 遍历目录下所有文件
-    for p in root.rglob("*"):
-        if p.is_file():
-            se = safe_stat(p)
-            if se is not None:
-                snap[p.resolve().as_posix()] = se
-    return snap
+    from .scanner import DirScanner
+    return DirScanner(root).scan()
 
 
-def compare_snapshots(old: Dict[str, SnapshotEntry], new: Dict[str, SnapshotEntry]):
+def compare_snapshots(old: Mapping[str, SnapshotEntry], new: Mapping[str, SnapshotEntry]):
     """比较两个快照，返回创建、修改、删除的文件列表"""
+    if isinstance(old, CompactSnapshot) and isinstance(new, CompactSnapshot):
+        return diff_compact(old, new)
     old_keys = set(old.keys())
     new_keys = set(new.keys())
     created = sorted(list(new_keys - old_keys))